@@ -1,23 +1,61 @@
 import sys
-from PyQt5 import QtWidgets, QtGui
-import pandas as pd
-
-try:
-    import qdarkstyle
-    THEME = True
-except ImportError:
-    THEME = False
+import time
+LAUNCH_START = time.perf_counter()
+import shutil
+from PyQt5 import QtWidgets, QtCore, QtGui
+from export_stream import EXPORT_FILTERS, export_inventory
+from io_worker import IOWorker
+from perf import configure_log, metrics
+from progress_dialog import run_with_progress
+from startup import LaunchTimer, cached_logo_pixmap, load_dark_stylesheet
+# pandas, numpy and the inventory modules are imported where first needed
 
 ITEMS_FILE = r"C:\Users\mohit\Documents\Coding\Project\BILLING_SOFTWARE\items.xlsx"
+BILLS_FILE = r"C:\Users\mohit\Documents\Coding\Project\BILLING_SOFTWARE\bills.xlsx"
+BILLS_DB = r"C:\Users\mohit\Documents\Coding\Project\BILLING_SOFTWARE\bills.db"
 LOGO_IMAGE = r"C:\Users\mohit\Documents\Coding\Project\BILLING_SOFTWARE\logo.jpg"  # Your company logo
+CACHE_DIR = r"C:\Users\mohit\Documents\Coding\Project\BILLING_SOFTWARE\cache"
+BACKUP_DIR = r"C:\Users\mohit\Documents\Coding\Project\BILLING_SOFTWARE\backups"
+SEARCH_DELAY_MS = 150
+MAX_SEARCH_RESULTS = 1000
+METRICS_SUMMARY_MS = 60_000
+
+def read_inventory_snapshot(path):
+    # Runs on the I/O thread, so pandas is imported there rather than on the GUI thread
+    from inventory_store import read_snapshot
+    with metrics.span("inventory read"):
+        return read_snapshot(path)
+
+def build_search_index(barcodes, names, layout_version, frame_version):
+    # Runs on the I/O thread; at 100k rows this takes longer than a keystroke may
+    from search_index import SearchIndex
+    with metrics.span("search index"):
+        return SearchIndex(barcodes, names, layout_version, frame_version)
 
 class InventoryApp(QtWidgets.QWidget):
-    def __init__(self):
+    def __init__(self, launch_timer=None):
         super().__init__()
+        self.launch_timer = launch_timer
         self.setWindowTitle("Inventory Manager")
-        self.setWindowIcon(QtGui.QIcon(LOGO_IMAGE))
+        self.setWindowIcon(QtGui.QIcon(cached_logo_pixmap(LOGO_IMAGE, CACHE_DIR, 64, 64)))
         self.resize(700, 400)
+        # Created once the I/O thread has read items.xlsx
+        self.inventory = None
+        self.search = None
+        self.model = None
+        self.feed = None
+        self.io = IOWorker(self)
+        self.writer = None
+        self.history = None
+        self.diagnostics = None
+        self.reload_pending = False
+        self.index_pending = False
         self.init_ui()
+        # Session timings go to the metrics log once a minute
+        self.metrics_timer = QtCore.QTimer(self)
+        self.metrics_timer.setInterval(METRICS_SUMMARY_MS)
+        self.metrics_timer.timeout.connect(lambda: metrics.log_summary("inventory"))
+        self.metrics_timer.start()
 
     def init_ui(self):
         main_layout = QtWidgets.QVBoxLayout(self)
@@ -51,18 +89,25 @@ class InventoryApp(QtWidgets.QWidget):
         search_layout = QtWidgets.QHBoxLayout()
         self.search_input = QtWidgets.QLineEdit()
         self.search_input.setPlaceholderText("Search by barcode or name...")
-        self.search_input.textChanged.connect(self.filter_table)
+        self.search_timer = QtCore.QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DELAY_MS)
+        self.search_timer.timeout.connect(self.filter_table)
+        self.search_input.textChanged.connect(self.search_timer.start)
         search_layout.addWidget(QtWidgets.QLabel("Search:"))
         search_layout.addWidget(self.search_input)
 
         # Table for inventory
-        self.table = QtWidgets.QTableWidget(0, 4)
-        self.table.setHorizontalHeaderLabels(["Barcode", "Name", "Quantity", "Price"])
+        self.table = QtWidgets.QTableView()
         self.table.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Stretch)
-        self.table.setSelectionBehavior(QtWidgets.QTableWidget.SelectRows)
-        self.table.setEditTriggers(QtWidgets.QTableWidget.NoEditTriggers)
+        self.table.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
+        self.table.setSelectionBehavior(QtWidgets.QTableView.SelectRows)
+        self.table.setSelectionMode(QtWidgets.QTableView.SingleSelection)
+        self.table.setEditTriggers(QtWidgets.QTableView.NoEditTriggers)
+        # Keep file order until a header is clicked
+        self.table.horizontalHeader().setSortIndicator(-1, QtCore.Qt.AscendingOrder)
+        self.table.setSortingEnabled(True)
         self.table.setToolTip("Inventory items list")
-        self.table.itemSelectionChanged.connect(self.on_table_select)
 
         # Edit/Delete/Export/Backup buttons
         btn_layout = QtWidgets.QHBoxLayout()
@@ -74,57 +119,147 @@ class InventoryApp(QtWidgets.QWidget):
         self.delete_btn.setToolTip("Delete selected item")
         self.delete_btn.clicked.connect(self.delete_item)
         self.delete_btn.setEnabled(False)
-        self.export_btn = QtWidgets.QPushButton("Export as CSV")
-        self.export_btn.setToolTip("Export inventory to CSV file")
+        self.export_btn = QtWidgets.QPushButton("Export Inventory")
+        self.export_btn.setToolTip("Export inventory to CSV or JSON Lines, optionally gzipped")
         self.export_btn.clicked.connect(self.export_csv)
         self.backup_btn = QtWidgets.QPushButton("Backup Inventory")
         self.backup_btn.setToolTip("Backup inventory Excel file")
-        self.backup_btn.clicked.connect(self.backup_inventory)
+        backup_menu = QtWidgets.QMenu(self.backup_btn)
+        backup_menu.addAction("Incremental Snapshot", self.snapshot_inventory)
+        backup_menu.addAction("Full Copy...", self.backup_inventory)
+        self.backup_btn.setMenu(backup_menu)
+        self.import_btn = QtWidgets.QPushButton("Import Supplier File")
+        self.import_btn.setToolTip("Merge a supplier CSV or Excel file into the inventory")
+        self.import_btn.clicked.connect(self.import_supplier_file)
         btn_layout.addWidget(self.edit_btn)
         btn_layout.addWidget(self.delete_btn)
+        btn_layout.addWidget(self.import_btn)
         btn_layout.addWidget(self.export_btn)
         btn_layout.addWidget(self.backup_btn)
+        self.report_btn = QtWidgets.QPushButton("Sales Report")
+        self.report_btn.setToolTip("Revenue per day, GST collected and top sellers")
+        self.report_btn.clicked.connect(self.show_sales_report)
+        btn_layout.addWidget(self.report_btn)
 
         main_layout.addLayout(form_layout)
         main_layout.addLayout(search_layout)
         main_layout.addWidget(self.table)
         main_layout.addLayout(btn_layout)
 
+        # Hidden diagnostics panel
+        QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+Shift+D"), self, self.show_diagnostics)
+
         self.load_table()
 
     def load_table(self):
+        if self.inventory is None:
+            # Shown once the I/O thread has parsed the file
+            self.reload_inventory()
+            return
+        # Our own writes come back through the change feed like any other counter's
+        self.feed.check()
+
+    def reload_inventory(self):
+        if self.reload_pending:
+            return
+        self.reload_pending = True
+        self.io.submit(read_inventory_snapshot, ITEMS_FILE, on_done=self.on_inventory_read, on_error=self.on_inventory_error)
+
+    @metrics.timed("inventory install")
+    def on_inventory_read(self, snapshot):
+        self.reload_pending = False
         try:
-            df = pd.read_excel(ITEMS_FILE)
+            if self.inventory is None:
+                from change_feed import InventoryFeed
+                from inventory_store import InventoryStore
+                from search_index import InventorySearch
+                self.inventory = InventoryStore(ITEMS_FILE)
+                self.search = InventorySearch(self.inventory)
+                # Sales and edits from any counter show up without re-reading the files
+                self.feed = InventoryFeed(self.inventory, self)
+                self.feed.items_changed.connect(self.on_items_changed)
+                self.feed.rows_changed.connect(self.show_inventory)
+                self.feed.file_changed.connect(self.reload_inventory)
+            self.inventory.install(*snapshot)
         except Exception as e:
-            df = pd.DataFrame(columns=["Barcode", "Name", "Quantity", "Price"])
-        self.df = df
-        self.displayed_df = df.copy()
-        self.refresh_table()
+            self.on_inventory_error(str(e))
+            return
+        self.show_inventory()
+        if self.launch_timer is not None:
+            self.launch_timer.mark("inventory ready")
+            self.launch_timer.report(CACHE_DIR)
+
+    def on_inventory_error(self, error):
+        self.reload_pending = False
+        QtWidgets.QMessageBox.critical(self, "Error", f"Error reading file: {error}")
+
+    def update_search_index(self):
+        # Rebuilt on the I/O thread after a load or a removed item; searches wait for it
+        if self.search.ready() or self.index_pending:
+            return
+        self.index_pending = True
+        self.io.submit(build_search_index, *self.search.source(), on_done=self.on_search_index_built,
+                       on_error=self.on_search_index_error)
+
+    def on_search_index_built(self, index):
+        self.index_pending = False
+        if not self.search.adopt(index):
+            # Items were removed or reloaded while it was built
+            self.update_search_index()
+            return
+        self.filter_table()
+
+    def on_search_index_error(self, error):
+        # Tried again on the next keystroke
+        self.index_pending = False
+
+    def writer_store(self):
+        # Only used from the I/O thread, which keeps its own journal connection
+        if self.writer is None:
+            from inventory_store import InventoryStore
+            self.writer = InventoryStore(ITEMS_FILE)
+        return self.writer
+
+    @metrics.timed("show inventory")
+    def show_inventory(self):
+        if self.model is None:
+            from inventory_model import InventoryTableModel
+            self.model = InventoryTableModel(self)
+            self.table.setModel(self.model)
+            self.table.selectionModel().selectionChanged.connect(self.on_table_select)
+        self.df = self.inventory.items_df
+        self.model.set_frame(self.df)
+        self.update_search_index()
+        self.filter_table()
+
+    def on_items_changed(self, barcodes):
+        if self.model is None:
+            return
+        index = self.inventory.index
+        self.model.update_items(self.inventory.items_df, [index[barcode] for barcode in barcodes if barcode in index])
 
     def refresh_table(self):
-        df = self.displayed_df
-        self.table.setRowCount(0)
-        for _, row in df.iterrows():
-            row_pos = self.table.rowCount()
-            self.table.insertRow(row_pos)
-            self.table.setItem(row_pos, 0, QtWidgets.QTableWidgetItem(str(row["Barcode"])))
-            self.table.setItem(row_pos, 1, QtWidgets.QTableWidgetItem(str(row["Name"])))
-            self.table.setItem(row_pos, 2, QtWidgets.QTableWidgetItem(str(row["Quantity"])))
-            self.table.setItem(row_pos, 3, QtWidgets.QTableWidgetItem(f"₹{row['Price']:.2f}"))
+        self.table.clearSelection()
         self.edit_btn.setEnabled(False)
         self.delete_btn.setEnabled(False)
 
+    @metrics.timed("search")
     def filter_table(self):
-        text = self.search_input.text().lower()
-        if text:
-            mask = self.df["Barcode"].astype(str).str.lower().str.contains(text) | self.df["Name"].astype(str).str.lower().str.contains(text)
-            self.displayed_df = self.df[mask].copy()
+        if self.model is None:
+            return
+        text = self.search_input.text()
+        if text.strip():
+            if not self.search.ready():
+                # Filtered once the index is in
+                self.update_search_index()
+                return
+            self.model.set_filter(self.search.search(text, limit=MAX_SEARCH_RESULTS))
         else:
-            self.displayed_df = self.df.copy()
+            self.model.set_filter(None)
         self.refresh_table()
 
     def on_table_select(self):
-        selected = self.table.selectedItems()
+        selected = self.table.selectionModel().selectedRows()
         self.edit_btn.setEnabled(bool(selected))
         self.delete_btn.setEnabled(bool(selected))
 
@@ -136,38 +271,28 @@ class InventoryApp(QtWidgets.QWidget):
         if not barcode or not name:
             QtWidgets.QMessageBox.warning(self, "Error", "Barcode and Name are required!")
             return
+        if self.inventory is None or not self.inventory.loaded:
+            QtWidgets.QMessageBox.warning(self, "Error", "Inventory is still loading, please wait.")
+            return
         try:
-            df = pd.read_excel(ITEMS_FILE)
-            required_columns = {"Barcode", "Name", "Quantity", "Price"}
-            if not required_columns.issubset(df.columns):
-                raise ValueError(f"The file {ITEMS_FILE} must contain the following columns: {required_columns}")
-        except FileNotFoundError:
-            df = pd.DataFrame(columns=["Barcode", "Name", "Quantity", "Price"])
-            QtWidgets.QMessageBox.information(self, "Info", f"{ITEMS_FILE} not found. A new file will be created.")
+            # Read even without a notification, so the check below sees every counter's sales
+            self.feed.poll()
         except Exception as e:
             QtWidgets.QMessageBox.critical(self, "Error", f"Error reading file: {e}")
             return
-        row = df[df["Barcode"].astype(str) == barcode]
-        if not row.empty:
-            idx = row.index[0]
-            new_qty = df.at[idx, "Quantity"] + qty
-            if new_qty < 0:
-                QtWidgets.QMessageBox.warning(self, "Error", "Quantity cannot be negative!")
-                return
-            df.at[idx, "Quantity"] = new_qty
-            df.at[idx, "Price"] = price
-        else:
-            df = pd.concat([df, pd.DataFrame([{
-                "Barcode": barcode,
-                "Name": name,
-                "Quantity": qty,
-                "Price": price
-            }])], ignore_index=True)
-        try:
-            df.to_excel(ITEMS_FILE, index=False)
-        except Exception as e:
-            QtWidgets.QMessageBox.critical(self, "Error", f"Failed to save inventory: {e}")
+        item = self.inventory.get(barcode)
+        if item is not None and item["Quantity"] + qty < 0:
+            QtWidgets.QMessageBox.warning(self, "Error", "Quantity cannot be negative!")
             return
+        self.io.submit(self.persist_item, barcode, name, qty, price,
+                       on_done=self.on_item_saved,
+                       on_error=lambda error: QtWidgets.QMessageBox.critical(self, "Error", f"Failed to save inventory: {error}"))
+
+    @metrics.timed("item save")
+    def persist_item(self, barcode, name, qty, price):
+        self.writer_store().upsert(barcode, name, qty, price)
+
+    def on_item_saved(self, _):
         QtWidgets.QMessageBox.information(self, "Success", "Item Added/Updated in Inventory!")
         self.barcode_input.clear()
         self.name_input.clear()
@@ -176,15 +301,12 @@ class InventoryApp(QtWidgets.QWidget):
         self.load_table()
 
     def edit_item(self):
-        selected = self.table.selectedItems()
+        selected = self.table.selectionModel().selectedRows()
         if not selected:
             return
-        row = self.table.currentRow()
-        barcode = self.table.item(row, 0).text()
-        item = self.df[self.df["Barcode"].astype(str) == barcode]
-        if item.empty:
+        item = self.inventory.get(self.model.barcode(selected[0].row()))
+        if item is None:
             return
-        item = item.iloc[0]
         self.barcode_input.setText(str(item["Barcode"]))
         self.name_input.setText(str(item["Name"]))
         self.qty_input.setValue(int(item["Quantity"]))
@@ -192,46 +314,129 @@ class InventoryApp(QtWidgets.QWidget):
         self.barcode_input.setFocus()
 
     def delete_item(self):
-        selected = self.table.selectedItems()
+        selected = self.table.selectionModel().selectedRows()
         if not selected:
             return
-        row = self.table.currentRow()
-        barcode = self.table.item(row, 0).text()
-        df = self.df[self.df["Barcode"].astype(str) != barcode].copy()
-        try:
-            df.to_excel(ITEMS_FILE, index=False)
-        except Exception as e:
-            QtWidgets.QMessageBox.critical(self, "Error", f"Failed to delete item: {e}")
-            return
+        barcode = self.model.barcode(selected[0].row())
+        self.io.submit(self.persist_delete, barcode,
+                       on_done=self.on_item_deleted,
+                       on_error=lambda error: QtWidgets.QMessageBox.critical(self, "Error", f"Failed to delete item: {error}"))
+
+    @metrics.timed("item delete")
+    def persist_delete(self, barcode):
+        self.writer_store().delete(barcode)
+
+    def on_item_deleted(self, _):
         QtWidgets.QMessageBox.information(self, "Success", "Item deleted from inventory.")
         self.load_table()
 
     def export_csv(self):
-        try:
-            df = pd.read_excel(ITEMS_FILE)
-            save_path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Export Inventory as CSV", "inventory.csv", "CSV Files (*.csv)")
-            if save_path:
-                df.to_csv(save_path, index=False)
-                QtWidgets.QMessageBox.information(self, "Success", f"Inventory exported to {save_path}")
-        except Exception as e:
-            QtWidgets.QMessageBox.critical(self, "Error", f"Failed to export: {e}")
+        save_path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Export Inventory", "inventory.csv", EXPORT_FILTERS)
+        if save_path:
+            # Written from the I/O thread's own copy of the inventory, a chunk at a time
+            run_with_progress(self, self.io, "Exporting inventory...", self.persist_export, save_path,
+                              on_done=lambda count: QtWidgets.QMessageBox.information(self, "Success", f"{count} items exported to {save_path}"),
+                              on_error=lambda error: QtWidgets.QMessageBox.critical(self, "Error", f"Failed to export: {error}"))
+
+    @metrics.timed("export")
+    def persist_export(self, path, progress=None):
+        return export_inventory(self.writer_store(), path, progress)
+
+    def import_supplier_file(self):
+        from bulk_import import IMPORT_FILTERS
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(self, "Import Supplier File", "", IMPORT_FILTERS)
+        if path:
+            # Checked and merged on the I/O thread; the inventory is written once at the end
+            run_with_progress(self, self.io, "Importing supplier file...", self.persist_import, path,
+                              on_done=lambda result: self.on_import_done(*result),
+                              on_error=lambda error: QtWidgets.QMessageBox.critical(self, "Error", f"Failed to import: {error}"))
+
+    @metrics.timed("import")
+    def persist_import(self, path, progress=None):
+        from bulk_import import import_inventory, report_path_for, write_report
+        report = import_inventory(self.writer_store(), path, progress)
+        report_path = None
+        if report["issues"]:
+            report_path = report_path_for(path)
+            write_report(report, report_path)
+        return report, report_path
+
+    def on_import_done(self, report, report_path):
+        from bulk_import import summary
+        text = summary(report)
+        if report_path:
+            text += f"\n\nIssues written to {report_path}"
+        QtWidgets.QMessageBox.information(self, "Import Finished", text)
+        self.load_table()
 
     def backup_inventory(self):
-        import shutil
-        try:
-            backup_path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Backup Inventory Excel File", "items_backup.xlsx", "Excel Files (*.xlsx)")
-            if backup_path:
-                shutil.copy2(ITEMS_FILE, backup_path)
-                QtWidgets.QMessageBox.information(self, "Success", f"Backup created at {backup_path}")
-        except Exception as e:
-            QtWidgets.QMessageBox.critical(self, "Error", f"Failed to backup: {e}")
+        backup_path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Backup Inventory Excel File", "items_backup.xlsx", "Excel Files (*.xlsx)")
+        if backup_path:
+            self.io.submit(self.persist_backup, backup_path,
+                           on_done=lambda _: QtWidgets.QMessageBox.information(self, "Success", f"Backup created at {backup_path}"),
+                           on_error=lambda error: QtWidgets.QMessageBox.critical(self, "Error", f"Failed to backup: {error}"))
+
+    @metrics.timed("backup")
+    def persist_backup(self, backup_path):
+        # Fold pending stock changes into the file so the copy is complete
+        self.writer_store().compact()
+        shutil.copy2(ITEMS_FILE, backup_path)
+
+    def history_store(self):
+        # Only used from the I/O thread
+        if self.history is None:
+            from bill_history import BillHistory
+            self.history = BillHistory(BILLS_DB)
+        return self.history
+
+    def show_sales_report(self):
+        from report_dialog import SalesReportDialog
+        SalesReportDialog(self, self.io, self.history_store, BILLS_FILE).exec_()
+
+    def snapshot_inventory(self):
+        # Unchanged items.xlsx is not even read again; the journal is small
+        run_with_progress(self, self.io, "Backing up inventory...", self.persist_snapshot,
+                          on_done=lambda manifest: QtWidgets.QMessageBox.information(
+                              self, "Success", f"Snapshot {manifest['name']} created in {BACKUP_DIR} "
+                                               f"({manifest['stored_bytes'] // 1024} KB new)"),
+                          on_error=lambda error: QtWidgets.QMessageBox.critical(self, "Error", f"Failed to backup: {error}"))
+
+    @metrics.timed("snapshot")
+    def persist_snapshot(self, progress=None):
+        # Holding the journal lock also keeps compaction from replacing items.xlsx meanwhile
+        from backup_store import SnapshotStore, snapshot_sqlite
+        from inventory_store import journal_path_for
+        return snapshot_sqlite(SnapshotStore(BACKUP_DIR, compress=True), [journal_path_for(ITEMS_FILE), ITEMS_FILE],
+                               "inventory", progress)
+
+    def show_diagnostics(self):
+        from diagnostics_dialog import DiagnosticsDialog
+        if self.diagnostics is None:
+            self.diagnostics = DiagnosticsDialog(self, CACHE_DIR)
+        self.diagnostics.show()
+        self.diagnostics.raise_()
+
+    def closeEvent(self, event):
+        if self.feed is not None:
+            self.feed.stop()
+        self.io.stop()
+        metrics.log_summary("inventory")
+        super().closeEvent(event)
 
 def main():
+    timer = LaunchTimer("inventory", start=LAUNCH_START)
+    timer.mark("imports")
+    configure_log(CACHE_DIR)
     app = QtWidgets.QApplication(sys.argv)
-    if THEME:
-        app.setStyleSheet(qdarkstyle.load_stylesheet_pyqt5())
-    window = InventoryApp()
+    timer.mark("qt application")
+    stylesheet = load_dark_stylesheet(CACHE_DIR)
+    if stylesheet:
+        app.setStyleSheet(stylesheet)
+    timer.mark("stylesheet")
+    window = InventoryApp(launch_timer=timer)
+    timer.mark("window built")
     window.show()
+    timer.mark("window shown")
     sys.exit(app.exec_())
 
 if __name__ == '__main__':
@@ -0,0 +1,253 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime
+from items_cache import file_signature
+from perf import metrics
+
+CHUNK_SIZE = 64 * 1024
+
+
+def sqlite_signature(path):
+    # A commit changes the -wal file or, once checkpointed, the database itself
+    return f"{file_signature(path)}|{file_signature(path + '-wal')}"
+
+
+class SnapshotStore:
+    """Incremental, deduplicated backups in one folder.
+
+    Files are split into 64 KiB chunks stored once under chunks/ by SHA-1,
+    and each snapshot is a small JSON manifest under snapshots/ listing the
+    chunks of every file. A snapshot only writes chunks that are not there
+    yet, and a file whose size and mtime match the previous snapshot of the
+    same label is not even read.
+    """
+
+    def __init__(self, root, compress=False):
+        self.root = root
+        self.compress = compress
+        self.chunk_dir = os.path.join(root, "chunks")
+        self.snapshot_dir = os.path.join(root, "snapshots")
+        os.makedirs(self.chunk_dir, exist_ok=True)
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+
+    def _chunk_path(self, digest):
+        return os.path.join(self.chunk_dir, digest[:2], digest)
+
+    def _has_chunk(self, digest):
+        path = self._chunk_path(digest)
+        return os.path.exists(path) or os.path.exists(path + ".z")
+
+    def _put_chunk(self, digest, data):
+        path = self._chunk_path(digest)
+        if self.compress:
+            packed = zlib.compress(data, 6)
+            # Already-compressed data such as .xlsx is kept as it is
+            if len(packed) < len(data) * 0.9:
+                path, data = path + ".z", packed
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return len(data)
+
+    def _get_chunk(self, digest):
+        path = self._chunk_path(digest)
+        if os.path.exists(path + ".z"):
+            with open(path + ".z", "rb") as f:
+                return zlib.decompress(f.read())
+        with open(path, "rb") as f:
+            return f.read()
+
+    def snapshots(self, label=None):
+        # Manifest names, oldest first
+        names = sorted(name for name in os.listdir(self.snapshot_dir) if name.endswith(".json"))
+        if label is not None:
+            names = [name for name in names if name.rsplit("_", 2)[0] == label]
+        return names
+
+    def manifest(self, name):
+        with open(os.path.join(self.snapshot_dir, name), encoding="utf-8") as f:
+            return json.load(f)
+
+    def latest(self, label):
+        # {file name: manifest entry} of the newest snapshot of label
+        earlier = self.snapshots(label)
+        if not earlier:
+            return {}
+        return {entry["name"]: entry for entry in self.manifest(earlier[-1])["files"]}
+
+    def reusable(self, entry, signature):
+        return entry is not None and entry["signature"] == signature and all(map(self._has_chunk, entry["chunks"]))
+
+    def snapshot(self, paths, label, progress=None, sources=None):
+        """Backs up paths as one snapshot; returns its manifest.
+
+        The manifest records how many bytes were newly stored, which is
+        what the snapshot cost on top of the ones before it. sources maps
+        a path to the (name, signature) to store it under, for copies
+        standing in for the real files.
+        """
+        previous = self.latest(label)
+        sources = sources or {}
+        sizes = [os.path.getsize(path) for path in paths]
+        total = sum(sizes)
+        done = 0
+        stored = 0
+        files = []
+        for path, size in zip(paths, sizes):
+            name, signature = sources.get(path) or (os.path.basename(path), file_signature(path))
+            entry = previous.get(name)
+            if self.reusable(entry, signature):
+                files.append(entry)
+                done += size
+                if progress is not None:
+                    progress(done, total)
+                continue
+            chunks = []
+            with open(path, "rb") as f:
+                for data in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    digest = hashlib.sha1(data).hexdigest()
+                    if not self._has_chunk(digest):
+                        stored += self._put_chunk(digest, data)
+                    chunks.append(digest)
+                    done += len(data)
+                    if progress is not None and len(chunks) % 64 == 0:
+                        progress(done, total)
+            files.append({"name": name, "size": size, "signature": signature, "chunks": chunks})
+            metrics.count("read", name, size)
+        now = datetime.now()
+        manifest = {
+            "label": label,
+            "created": now.isoformat(timespec="seconds"),
+            "stored_bytes": stored,
+            "files": files,
+        }
+        metrics.count("write", "snapshot", stored)
+        name = f"{label}_{now.strftime('%Y%m%d_%H%M%S')}.json"
+        suffix = 1
+        while os.path.exists(os.path.join(self.snapshot_dir, name)):
+            suffix += 1
+            name = f"{label}_{now.strftime('%Y%m%d_%H%M%S')}{suffix:02d}.json"
+        tmp_path = os.path.join(self.snapshot_dir, name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, os.path.join(self.snapshot_dir, name))
+        if progress is not None:
+            progress(total, total)
+        manifest["name"] = name
+        return manifest
+
+    def restore(self, name, dest_dir):
+        # Writes every file of the snapshot into dest_dir; returns their paths
+        os.makedirs(dest_dir, exist_ok=True)
+        restored = []
+        for entry in self.manifest(name)["files"]:
+            path = os.path.join(dest_dir, entry["name"])
+            with open(path + ".tmp", "wb") as f:
+                for digest in entry["chunks"]:
+                    f.write(self._get_chunk(digest))
+            os.replace(path + ".tmp", path)
+            restored.append(path)
+        return restored
+
+
+def snapshot_sqlite(store, paths, label, progress=None):
+    """Snapshots the SQLite database paths[0] with files tied to it.
+
+    Files in paths[1:] only change under the database's write lock, like
+    items.xlsx next to its stock journal. Only the copying happens in a
+    transaction. The backup API copies the
+    database in a read transaction, which in WAL mode does not hold up
+    other connections' commits. The write lock is taken only when other
+    files must match the database. Files unchanged since the last snapshot
+    are not copied. Hashing and storing chunks then run on the copies.
+    """
+    previous = store.latest(label)
+    tmp_dir = tempfile.mkdtemp(prefix="copy_", dir=store.root)
+    try:
+        copies = []
+        sources = {}
+        conn = sqlite3.connect(paths[0], timeout=30, isolation_level=None)
+        # The backup API cannot copy from a connection that holds the write lock itself
+        lock = sqlite3.connect(paths[0], timeout=30, isolation_level=None) if len(paths) > 1 else None
+        try:
+            if lock is not None:
+                lock.execute("BEGIN IMMEDIATE")
+            conn.execute("BEGIN")
+            signatures = [sqlite_signature(paths[0])] + [file_signature(path) for path in paths[1:]]
+            # The copy sees the database as of this read; later commits change the signature
+            conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            for number, (path, signature) in enumerate(zip(paths, signatures)):
+                name = os.path.basename(path)
+                copy_path = path
+                if not store.reusable(previous.get(name), signature):
+                    copy_path = os.path.join(tmp_dir, name)
+                    if number == 0:
+                        dest = sqlite3.connect(copy_path)
+                        try:
+                            conn.backup(dest)
+                        finally:
+                            dest.close()
+                    else:
+                        shutil.copyfile(path, copy_path)
+                copies.append(copy_path)
+                sources[copy_path] = (name, signature)
+        finally:
+            for connection in (conn, lock):
+                if connection is not None:
+                    if connection.in_transaction:
+                        connection.execute("ROLLBACK")
+                    connection.close()
+        return store.snapshot(copies, label, progress, sources)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Incremental, deduplicated backups.")
+    parser.add_argument("--to", default="backups", help="backup folder")
+    commands = parser.add_subparsers(dest="command", required=True)
+    snap = commands.add_parser("snapshot", help="back up files as one snapshot")
+    snap.add_argument("label")
+    snap.add_argument("files", nargs="+", help="files; the first one may be an SQLite database to lock")
+    snap.add_argument("--compress", action="store_true", help="zlib-compress chunks that shrink")
+    snap.add_argument("--sqlite", action="store_true", help="copy the first file as an SQLite database, consistent with the others")
+    listing = commands.add_parser("list", help="list snapshots")
+    listing.add_argument("label", nargs="?")
+    restore = commands.add_parser("restore", help="restore a snapshot")
+    restore.add_argument("name")
+    restore.add_argument("dest")
+    args = parser.parse_args(argv)
+
+    store = SnapshotStore(args.to, compress=getattr(args, "compress", False))
+    if args.command == "snapshot":
+        start = time.perf_counter()
+        if args.sqlite:
+            manifest = snapshot_sqlite(store, args.files, args.label)
+        else:
+            manifest = store.snapshot(args.files, args.label)
+        size = sum(entry["size"] for entry in manifest["files"])
+        print(f"{manifest['name']}: {size} bytes, {manifest['stored_bytes']} new, "
+              f"{time.perf_counter() - start:.2f} s")
+    elif args.command == "list":
+        for name in store.snapshots(args.label):
+            manifest = store.manifest(name)
+            size = sum(entry["size"] for entry in manifest["files"])
+            print(f"{name}  {len(manifest['files'])} files  {size} bytes  {manifest['stored_bytes']} new")
+    elif args.command == "restore":
+        for path in store.restore(args.name, args.dest):
+            print(path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
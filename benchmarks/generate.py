@@ -0,0 +1,120 @@
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SCALES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+WORDS = ["Milk", "Soap", "Sprite", "Rice", "Dal", "Atta", "Sugar", "Tea", "Coffee", "Biscuit", "Oil", "Salt",
+         "Shampoo", "Paste", "Chips", "Juice", "Bread", "Butter", "Paneer", "Curd", "Masala", "Noodles"]
+SIZES = ["50g", "100g", "250g", "500g", "1kg", "250ml", "500ml", "1L", "2L", "Pack of 4"]
+# Legacy bills.xlsx has one sheet per bill, which openpyxl cannot write or read at 1M;
+# above this many bills the history only goes into bills.db
+MAX_LEGACY_SHEETS = 2_000
+
+
+def scale_size(scale):
+    return SCALES[scale.lower()]
+
+
+def barcodes(n, seed=0):
+    # Unique 8-13 digit codes, the same for the same seed
+    rng = random.Random(seed)
+    seen = set()
+    codes = []
+    while len(codes) < n:
+        code = str(rng.randrange(10_000_000, 9_999_999_999_999))
+        if code not in seen:
+            seen.add(code)
+            codes.append(code)
+    return codes
+
+
+def generate_items(path, n, seed=0):
+    from openpyxl import Workbook
+    rng = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    ws.append(["Barcode", "Name", "Price", "Quantity"])
+    for code in barcodes(n, seed):
+        name = f"{rng.choice(WORDS)} {rng.choice(WORDS)} {rng.choice(SIZES)}"
+        ws.append([code, name, rng.randrange(5, 2_000), rng.randrange(50, 5_000)])
+    wb.save(path)
+    return path
+
+
+def random_bills(codes, prices, n, seed=0, start=None):
+    from billing_engine import build_bill
+    rng = random.Random(seed)
+    now = start or datetime(2023, 1, 1, 9, 0, 0)
+    for _ in range(n):
+        now += timedelta(seconds=rng.randrange(30, 600))
+        lines = []
+        for code in rng.sample(codes, rng.randrange(1, 8)):
+            lines.append((code, f"Item {code}", rng.randrange(1, 4), prices[code]))
+        bill = build_bill(lines, rng.random() < 0.5, now)
+        # Same ids for the same seed
+        bill["bill_id"] = f"{now.strftime('%Y%m%d_%H%M%S')}_{rng.getrandbits(24):06x}"
+        yield bill
+
+
+def generate_bills(db_path, xlsx_path, items_path, n, seed=0):
+    # bills.db with n bills; bills.xlsx in the legacy layout with up to MAX_LEGACY_SHEETS of them
+    from bill_store import SQLiteBillStore, bill_sheet_rows
+    from openpyxl import Workbook
+    from inventory_store import read_inventory_file
+    df = read_inventory_file(items_path)
+    codes = [str(code) for code in df["Barcode"]]
+    prices = dict(zip(codes, df["Price"].astype(float)))
+    store = SQLiteBillStore(db_path)
+    wb = Workbook(write_only=True)
+    batch = []
+    legacy = 0
+    for bill in random_bills(codes, prices, n, seed):
+        if legacy < min(n, MAX_LEGACY_SHEETS):
+            ws = wb.create_sheet(f"Bill_{bill['bill_id']}")
+            for row in bill_sheet_rows(bill):
+                ws.append(row)
+            legacy += 1
+        batch.append(bill)
+        if len(batch) == 10_000:
+            store.add_bills(batch)
+            batch = []
+    store.add_bills(batch)
+    store.close()
+    wb.save(xlsx_path)
+    return db_path, xlsx_path
+
+
+def dataset(data_dir, scale, seed=0):
+    # Generated once per scale and seed, then reused
+    n = scale_size(scale)
+    folder = os.path.join(data_dir, f"{scale.lower()}_{seed}")
+    items = os.path.join(folder, "items.xlsx")
+    bills_db = os.path.join(folder, "bills.db")
+    bills_xlsx = os.path.join(folder, "bills.xlsx")
+    if not os.path.exists(bills_xlsx):
+        os.makedirs(folder, exist_ok=True)
+        if os.path.exists(bills_db):
+            os.remove(bills_db)
+        generate_items(items, n, seed)
+        generate_bills(bills_db, bills_xlsx, items, n, seed)
+    return {"items": items, "bills_db": bills_db, "bills_xlsx": bills_xlsx, "size": n}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic items.xlsx, bills.db and bills.xlsx.")
+    parser.add_argument("--scales", default="1k,10k", help="comma separated: " + ",".join(SCALES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+    args = parser.parse_args(argv)
+    for scale in args.scales.split(","):
+        paths = dataset(args.out, scale.strip(), args.seed)
+        print(f"{scale}: {paths['items']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
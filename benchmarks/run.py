@@ -0,0 +1,321 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from generate import dataset  # noqa: E402
+
+BASELINES = os.path.join(BENCH_DIR, "baselines.json")
+DATA_DIR = os.path.join(BENCH_DIR, "data")
+# A change must be this much slower than the baseline, and by more than
+# SLACK_MS, before it is reported; sub-millisecond timings are noisy
+TOLERANCE = 0.25
+SLACK_MS = 0.2
+
+
+def summarize(samples):
+    # samples: durations in seconds
+    ordered = sorted(samples)
+
+    def pct(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    total = sum(ordered)
+    return {
+        "count": len(ordered),
+        "p50_ms": round(pct(0.50), 3),
+        "p90_ms": round(pct(0.90), 3),
+        "p99_ms": round(pct(0.99), 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+        "ops_per_s": round(len(ordered) / total, 1) if total else None,
+    }
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def query_prefixes(names, count, rng):
+    # What a cashier types: growing prefixes of real item names
+    queries = []
+    for name in rng.sample(names, min(count, len(names))):
+        word = name.split()[0]
+        queries.extend(word[:i] for i in range(1, len(word) + 1))
+    return queries
+
+
+class Harness:
+    """Runs the real windows offscreen against a private copy of a dataset."""
+
+    def __init__(self, data, work_dir, trace_memory=False):
+        from PyQt5 import QtWidgets
+        import billing
+        import Inventory_entry
+        self.data = data
+        self.work_dir = work_dir
+        self.trace_memory = trace_memory
+        shutil.copy(data["items"], os.path.join(work_dir, "items.xlsx"))
+        shutil.copy(data["bills_db"], os.path.join(work_dir, "bills.db"))
+        shutil.copy(data["bills_xlsx"], os.path.join(work_dir, "bills.xlsx"))
+        for module in (billing, Inventory_entry):
+            module.ITEMS_FILE = os.path.join(work_dir, "items.xlsx")
+            module.BILLS_DB = os.path.join(work_dir, "bills.db")
+            module.BILLS_FILE = os.path.join(work_dir, "bills.xlsx")
+            module.CACHE_DIR = os.path.join(work_dir, "cache")
+            module.BACKUP_DIR = os.path.join(work_dir, "backups")
+        # Dialogs would block a headless run
+        for name in ("information", "warning", "critical"):
+            setattr(QtWidgets.QMessageBox, name, staticmethod(lambda *args, **kwargs: None))
+        self.app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+        self.billing = billing
+        self.inventory_entry = Inventory_entry
+        self.results = {}
+
+    def wait(self, window, timeout=3600):
+        deadline = time.perf_counter() + timeout
+        while window.io.pending() and time.perf_counter() < deadline:
+            self.app.processEvents()
+            time.sleep(0.001)
+        self.app.processEvents()
+
+    def record(self, name, samples, **extra):
+        stats = summarize(samples)
+        stats.update(extra)
+        stats["rss_peak_mb"] = peak_rss_mb()
+        self.results[name] = stats
+        print(f"  {name:<26} p50 {stats['p50_ms']:>9.3f} ms  p90 {stats['p90_ms']:>9.3f} ms  "
+              f"p99 {stats['p99_ms']:>9.3f} ms  n={stats['count']}", file=sys.stderr)
+
+    def run(self, name, fn, *args):
+        # Optional tracemalloc peak; off by default because it slows Python code down
+        if not self.trace_memory:
+            fn(*args)
+            return
+        import tracemalloc
+        tracemalloc.start()
+        try:
+            fn(*args)
+        finally:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        print(f"  {name:<26} traced peak {peak / 1e6:.1f} MB", file=sys.stderr)
+
+
+def bench_inventory_load(h, rng, repeat):
+    # InventoryApp start to a populated table, first without and then with the sidecar cache
+    from items_cache import cache_dir_for
+    for mode in ("cold", "warm"):
+        samples = []
+        for _ in range(1 if mode == "cold" else repeat):
+            if mode == "cold":
+                shutil.rmtree(cache_dir_for(h.inventory_entry.ITEMS_FILE), ignore_errors=True)
+            start = time.perf_counter()
+            window = h.inventory_entry.InventoryApp()
+            h.wait(window)
+            samples.append(time.perf_counter() - start)
+            window.close()
+        h.record(f"inventory_load_{mode}", samples)
+
+
+def bench_inventory_filter(h, rng, repeat):
+    window = h.inventory_entry.InventoryApp()
+    h.wait(window)
+    names = [str(name) for name in window.inventory.items_df["Name"]]
+    window.search_input.blockSignals(True)
+    samples = []
+    for query in query_prefixes(names, 20 * repeat, rng):
+        window.search_input.setText(query)
+        start = time.perf_counter()
+        window.filter_table()
+        samples.append(time.perf_counter() - start)
+    h.record("inventory_filter", samples)
+    window.close()
+
+
+def bench_billing(h, rng, repeat):
+    window = h.billing.BillingApp()
+    h.wait(window)
+    df = window.inventory.items_df
+    codes = [str(code) for code in df["Barcode"]]
+    names = [str(name) for name in df["Name"]]
+
+    # Scan bursts: 50 scans per cart, then the cart is abandoned
+    samples = []
+    window.qty_input.setValue(1)
+    for i, code in enumerate(rng.choices(codes, k=100 * repeat)):
+        window.barcode_input.setText(code)
+        start = time.perf_counter()
+        window.add_item()
+        samples.append(time.perf_counter() - start)
+        if i % 50 == 49:
+            window.clear_cart()
+    window.clear_cart()
+    h.record("add_item", samples)
+
+    window.search_input.blockSignals(True)
+    samples = []
+    for query in query_prefixes(names, 20 * repeat, rng):
+        window.search_input.setText(query)
+        start = time.perf_counter()
+        window.filter_inventory()
+        samples.append(time.perf_counter() - start)
+    h.record("filter_inventory", samples)
+
+    for code in rng.sample(codes, min(100, len(codes))):
+        window.barcode_input.setText(code)
+        window.add_item()
+    samples = []
+    for _ in range(20 * repeat):
+        start = time.perf_counter()
+        window.refresh_table()
+        samples.append(time.perf_counter() - start)
+    h.record("refresh_table", samples, cart_lines=len(window.cart))
+    window.clear_cart()
+
+    # generate_bill returns once the bill is queued; throughput counts until it is saved
+    samples = []
+    bills = 20 * repeat
+    begin = time.perf_counter()
+    for _ in range(bills):
+        for code in rng.sample(codes, min(5, len(codes))):
+            window.barcode_input.setText(code)
+            window.add_item()
+        start = time.perf_counter()
+        window.generate_bill()
+        samples.append(time.perf_counter() - start)
+    h.wait(window)
+    elapsed = time.perf_counter() - begin
+    h.record("generate_bill", samples, saved_per_s=round(bills / elapsed, 1))
+    window.close()
+
+
+def bench_history(h, rng, repeat):
+    from bill_history import BillHistory, sales_report
+    history = BillHistory(h.billing.BILLS_DB)
+    start = time.perf_counter()
+    history.sync_legacy(h.billing.BILLS_FILE)
+    h.record("history_legacy_sync", [time.perf_counter() - start])
+    last_day = history.conn.execute("SELECT MAX(bill_date) FROM bills").fetchone()[0]
+    samples = []
+    for _ in range(5 * repeat):
+        start = time.perf_counter()
+        sales_report(history, None, "2000-01-01", last_day)
+        samples.append(time.perf_counter() - start)
+    h.record("sales_report_all", samples)
+    samples = []
+    for _ in range(5 * repeat):
+        start = time.perf_counter()
+        sales_report(history, None, last_day[:8] + "01", last_day)
+        samples.append(time.perf_counter() - start)
+    h.record("sales_report_month", samples)
+    history.close()
+
+
+BENCHMARKS = {
+    "inventory_load": bench_inventory_load,
+    "inventory_filter": bench_inventory_filter,
+    "billing": bench_billing,
+    "history": bench_history,
+}
+
+
+def compare(results, baselines):
+    # Returns human-readable regressions against the stored baselines
+    regressions = []
+    for scale, benches in results.items():
+        for bench, stats in benches.items():
+            base = baselines.get("results", {}).get(scale, {}).get(bench)
+            if not base:
+                continue
+            for key in ("p50_ms", "p90_ms", "p99_ms"):
+                if key in base and stats.get(key) is not None:
+                    limit = base[key] * (1 + TOLERANCE) + SLACK_MS
+                    if stats[key] > limit:
+                        regressions.append(f"{scale} {bench} {key}: {stats[key]:.3f} ms (baseline {base[key]:.3f} ms)")
+            for key in ("saved_per_s",):
+                if base.get(key) and stats.get(key) is not None and stats[key] < base[key] / (1 + TOLERANCE):
+                    regressions.append(f"{scale} {bench} {key}: {stats[key]} (baseline {base[key]})")
+    return regressions
+
+
+def machine():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the billing and inventory hot paths offscreen.")
+    parser.add_argument("--scales", default="1k,10k", help="comma separated: 1k,10k,100k,1m")
+    parser.add_argument("--only", help="comma separated subset of: " + ",".join(BENCHMARKS))
+    parser.add_argument("--repeat", type=int, default=5, help="multiplies the number of samples")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trace-memory", action="store_true", help="also report tracemalloc peaks (slower)")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baselines")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with status 1 on regressions")
+    args = parser.parse_args(argv)
+
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    results = {}
+    for scale in (s.strip().lower() for s in args.scales.split(",")):
+        print(f"[{scale}] preparing data...", file=sys.stderr)
+        data = dataset(DATA_DIR, scale, args.seed)
+        work_dir = tempfile.mkdtemp(prefix=f"bench_{scale}_")
+        try:
+            h = Harness(data, work_dir, args.trace_memory)
+            for name in names:
+                h.run(name, BENCHMARKS[name], h, random.Random(args.seed), args.repeat)
+            results[scale] = h.results
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {"machine": machine(), "created": time.strftime("%Y-%m-%d %H:%M:%S"), "results": results}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    status = 0
+    if os.path.exists(BASELINES) and not args.save_baseline:
+        with open(BASELINES, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f))
+        if regressions:
+            print("Regressions against benchmarks/baselines.json:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            status = 1 if args.fail_on_regression else 0
+        else:
+            print("No regressions against benchmarks/baselines.json", file=sys.stderr)
+    if args.save_baseline:
+        baselines = {"machine": report["machine"], "created": report["created"], "results": {}}
+        if os.path.exists(BASELINES):
+            with open(BASELINES, encoding="utf-8") as f:
+                baselines["results"] = json.load(f).get("results", {})
+        for scale, benches in results.items():
+            baselines["results"].setdefault(scale, {}).update(benches)
+        with open(BASELINES, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,264 @@
+import argparse
+import sys
+from datetime import datetime
+from bill_store import SQLiteBillStore
+from items_cache import file_signature
+
+SHEET_PREFIX = "Bill_"
+# Bills written before per-item GST slabs say "GST (18%)"
+SUMMARY_LABELS = {"Subtotal": "subtotal", "GST": "gst", "GST (18%)": "gst", "Grand Total": "grand_total"}
+STAMP_LABELS = ("Bill ID:", "Date:", "Time:")
+
+
+def parse_legacy_sheet(sheet_name, rows):
+    # Rebuilds a bill from one bills.xlsx sheet, or returns None if the sheet
+    # is not a bill. The old app wrote the Bill ID/Date/Time stamps over
+    # A6:B8, so on longer bills the barcode and name of lines 5-7 are lost;
+    # those lines keep their quantities and totals with a blank barcode.
+    from inventory_store import barcode_key
+    if not sheet_name.startswith(SHEET_PREFIX):
+        return None
+    bill_id = sheet_name[len(SHEET_PREFIX):]
+    stamps = {}
+    items = []
+    summary = {}
+    for row in rows[1:]:
+        row = list(row) + [None] * (5 - len(row))
+        label = row[3]
+        if row[0] in STAMP_LABELS:
+            stamps[row[0]] = row[1]
+        if label in SUMMARY_LABELS:
+            summary[SUMMARY_LABELS[label]] = float(row[4] or 0)
+        elif row[2] not in (None, ""):
+            if row[0] in STAMP_LABELS:
+                barcode, name = "", ""
+            else:
+                barcode, name = barcode_key(row[0]), str(row[1] or "")
+            items.append([barcode, name, int(row[2]), float(row[3] or 0), float(row[4] or 0)])
+    bill_id = str(stamps.get("Bill ID:") or bill_id)
+    try:
+        stamped = datetime.strptime(bill_id[:15], "%Y%m%d_%H%M%S")
+    except ValueError:
+        stamped = None
+    date = stamps.get("Date:") or (stamped and stamped.strftime('%Y-%m-%d'))
+    time = stamps.get("Time:") or (stamped and stamped.strftime('%H:%M:%S'))
+    if not items or not date:
+        return None
+    subtotal = summary.get("subtotal", sum(item[4] for item in items))
+    gst = summary.get("gst", 0.0)
+    return {
+        "bill_id": bill_id,
+        "date": str(date),
+        "time": str(time or "00:00:00"),
+        "items": items,
+        "subtotal": subtotal,
+        "gst": gst,
+        "grand_total": summary.get("grand_total", subtotal + gst),
+    }
+
+
+def date_range(column, start=None, end=None):
+    # WHERE clause and parameters for an inclusive YYYY-MM-DD range
+    clauses = []
+    params = []
+    if start:
+        clauses.append(f"{column} >= ?")
+        params.append(start)
+    if end:
+        clauses.append(f"{column} <= ?")
+        params.append(end)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+class BillHistory(SQLiteBillStore):
+    """Bills database with indexed history queries and sales aggregates.
+
+    Bills from the legacy bills.xlsx (one sheet per bill) are copied in
+    once by sync_legacy(); sheets already copied are remembered, so later
+    calls only read new sheets, and an unchanged file is not opened at all.
+    """
+
+    LEGACY_SCHEMA = """
+        CREATE TABLE IF NOT EXISTS legacy_sheets (
+            sheet_name TEXT PRIMARY KEY,
+            bill_id TEXT
+        );
+        CREATE TABLE IF NOT EXISTS history_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.conn.executescript(self.LEGACY_SCHEMA)
+
+    def _meta(self, key):
+        row = self.conn.execute("SELECT value FROM history_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def sync_legacy(self, xlsx_path):
+        # Returns the number of bills added from new sheets
+        signature = file_signature(xlsx_path)
+        if signature is None or signature == self._meta("legacy_signature"):
+            return 0
+        from openpyxl import load_workbook
+        done = {name for (name,) in self.conn.execute("SELECT sheet_name FROM legacy_sheets")}
+        wb = load_workbook(xlsx_path, read_only=True)
+        try:
+            sheets = []
+            for name in wb.sheetnames:
+                if name in done:
+                    continue
+                rows = list(wb[name].iter_rows(values_only=True)) if name.startswith(SHEET_PREFIX) else []
+                sheets.append((name, parse_legacy_sheet(name, rows)))
+        finally:
+            wb.close()
+        known = set()
+        bills = []
+        for name, bill in sheets:
+            if bill is None or bill["bill_id"] in known:
+                continue
+            known.add(bill["bill_id"])
+            bills.append(bill)
+        # Bills exported back to Excel from this database are already here
+        existing = set()
+        ids = [bill["bill_id"] for bill in bills]
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            existing.update(bill_id for (bill_id,) in self.conn.execute(
+                f"SELECT bill_id FROM bills WHERE bill_id IN ({','.join('?' * len(chunk))})", chunk))
+        bills = [bill for bill in bills if bill["bill_id"] not in existing]
+        with self.conn:
+            self._insert_bills(bills)
+            self.conn.executemany("INSERT INTO legacy_sheets VALUES (?, ?)",
+                                  [(name, bill and bill["bill_id"]) for name, bill in sheets])
+            self.conn.execute("INSERT OR REPLACE INTO history_meta VALUES ('legacy_signature', ?)", (signature,))
+        return len(bills)
+
+    def get_bill(self, bill_id):
+        header = self.conn.execute(
+            "SELECT bill_id, bill_date, bill_time, subtotal, gst, grand_total FROM bills WHERE bill_id = ?",
+            (bill_id,)).fetchone()
+        if header is None:
+            return None
+        items = self.conn.execute(
+            "SELECT barcode, name, qty, unit_price, total FROM bill_items WHERE bill_id = ? ORDER BY line_no",
+            (bill_id,)).fetchall()
+        return {
+            "bill_id": header[0],
+            "date": header[1],
+            "time": header[2],
+            "items": [list(item) for item in items],
+            "subtotal": header[3],
+            "gst": header[4],
+            "grand_total": header[5],
+        }
+
+    def bills_between(self, start=None, end=None):
+        where, params = date_range("bill_date", start, end)
+        return self.conn.execute(
+            "SELECT bill_id, bill_date, bill_time, subtotal, gst, grand_total FROM bills"
+            + where + " ORDER BY bill_date, bill_time", params).fetchall()
+
+    def totals(self, start=None, end=None):
+        where, params = date_range("bill_date", start, end)
+        bills, subtotal, gst, grand_total = self.conn.execute(
+            "SELECT COUNT(*), TOTAL(subtotal), TOTAL(gst), TOTAL(grand_total) FROM bills" + where,
+            params).fetchone()
+        return {"bills": bills, "subtotal": subtotal, "gst": gst, "grand_total": grand_total}
+
+    def revenue_per_day(self, start=None, end=None):
+        # [(date, bills, subtotal, gst, grand_total)]
+        where, params = date_range("bill_date", start, end)
+        return self.conn.execute(
+            "SELECT bill_date, COUNT(*), TOTAL(subtotal), TOTAL(gst), TOTAL(grand_total) FROM bills"
+            + where + " GROUP BY bill_date ORDER BY bill_date", params).fetchall()
+
+    def top_sellers(self, start=None, end=None, limit=10, by="qty"):
+        # [(barcode, name, qty, revenue)]; lines whose barcode was lost are left out
+        where, params = date_range("b.bill_date", start, end)
+        where = (where + " AND" if where else " WHERE") + " i.barcode != ''"
+        order = "revenue" if by == "revenue" else "qty"
+        return self.conn.execute(
+            "SELECT i.barcode, MAX(i.name), SUM(i.qty) AS qty, TOTAL(i.total) AS revenue"
+            " FROM bill_items i JOIN bills b ON b.bill_id = i.bill_id" + where
+            + f" GROUP BY i.barcode ORDER BY {order} DESC LIMIT ?", params + [limit]).fetchall()
+
+    def item_sales(self, barcode, start=None, end=None):
+        from inventory_store import barcode_key
+        where, params = date_range("b.bill_date", start, end)
+        where = (where + " AND" if where else " WHERE") + " i.barcode = ?"
+        bills, qty, revenue = self.conn.execute(
+            "SELECT COUNT(DISTINCT i.bill_id), TOTAL(i.qty), TOTAL(i.total)"
+            " FROM bill_items i JOIN bills b ON b.bill_id = i.bill_id" + where,
+            params + [barcode_key(barcode)]).fetchone()
+        return {"barcode": barcode_key(barcode), "bills": bills, "qty": int(qty), "revenue": revenue}
+
+
+def sales_report(history, legacy_path=None, start=None, end=None, barcode=None, limit=10):
+    # Everything the report dialogs show, in one call on the I/O thread
+    added = history.sync_legacy(legacy_path) if legacy_path else 0
+    return {
+        "legacy_added": added,
+        "totals": history.totals(start, end),
+        "per_day": history.revenue_per_day(start, end),
+        "top": history.top_sellers(start, end, limit),
+        "item": history.item_sales(barcode, start, end) if barcode else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query bill history and sales totals.")
+    parser.add_argument("--bills-db", default="bills.db", help="bills database")
+    parser.add_argument("--legacy", default="bills.xlsx", help="legacy bills workbook to index first ('' to skip)")
+    parser.add_argument("--from", dest="start", help="first day, YYYY-MM-DD")
+    parser.add_argument("--to", dest="end", help="last day, YYYY-MM-DD")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("totals", help="bill count, subtotal, GST and grand total")
+    commands.add_parser("daily", help="revenue and GST per day")
+    top = commands.add_parser("top", help="best selling items")
+    top.add_argument("--limit", type=int, default=10)
+    top.add_argument("--by", choices=["qty", "revenue"], default="qty")
+    item = commands.add_parser("item", help="sales of one barcode")
+    item.add_argument("barcode")
+    bill = commands.add_parser("bill", help="show one bill")
+    bill.add_argument("bill_id")
+    args = parser.parse_args(argv)
+
+    history = BillHistory(args.bills_db)
+    try:
+        if args.legacy:
+            added = history.sync_legacy(args.legacy)
+            if added:
+                print(f"Indexed {added} bills from {args.legacy}", file=sys.stderr)
+        if args.command == "totals":
+            t = history.totals(args.start, args.end)
+            print(f"Bills: {t['bills']}  Subtotal: ₹{t['subtotal']:.2f}  GST: ₹{t['gst']:.2f}  Grand Total: ₹{t['grand_total']:.2f}")
+        elif args.command == "daily":
+            print(f"{'Date':<12}{'Bills':>8}{'Subtotal':>14}{'GST':>12}{'Grand Total':>14}")
+            for date, bills, subtotal, gst, grand_total in history.revenue_per_day(args.start, args.end):
+                print(f"{date:<12}{bills:>8}{subtotal:>14.2f}{gst:>12.2f}{grand_total:>14.2f}")
+        elif args.command == "top":
+            print(f"{'Barcode':<16}{'Name':<30}{'Qty':>8}{'Revenue':>14}")
+            for barcode, name, qty, revenue in history.top_sellers(args.start, args.end, args.limit, args.by):
+                print(f"{barcode:<16}{name:<30}{qty:>8}{revenue:>14.2f}")
+        elif args.command == "item":
+            s = history.item_sales(args.barcode, args.start, args.end)
+            print(f"{s['barcode']}: {s['qty']} sold in {s['bills']} bills, ₹{s['revenue']:.2f}")
+        elif args.command == "bill":
+            found = history.get_bill(args.bill_id)
+            if found is None:
+                print(f"Bill not found: {args.bill_id}", file=sys.stderr)
+                return 1
+            from bill_store import bill_table_rows
+            print(f"Bill ID: {found['bill_id']}  Date: {found['date']}  Time: {found['time']}")
+            for row in bill_table_rows(found):
+                print("\t".join(str(cell) for cell in row))
+    finally:
+        history.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
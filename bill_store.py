@@ -0,0 +1,187 @@
+import sqlite3
+import uuid
+from datetime import datetime
+from perf import file_size, metrics
+
+BILL_COLUMNS = ["Barcode", "Name", "Qty", "Unit Price", "Total"]
+BILL_LINE_COLUMNS = ["Bill ID", "Date", "Time", "Line", "Barcode", "Name", "Qty", "Unit Price", "Total",
+                     "Subtotal", "GST", "Grand Total"]
+
+
+def new_bill_id(now=None):
+    now = now or datetime.now()
+    return now.strftime('%Y%m%d_%H%M%S') + "_" + str(uuid.uuid4())[:6]
+
+
+def make_bill(items, subtotal, gst, grand_total, now=None):
+    # items: list of [barcode, name, qty, unit_price, total]
+    now = now or datetime.now()
+    return {
+        "bill_id": new_bill_id(now),
+        "date": now.strftime('%Y-%m-%d'),
+        "time": now.strftime('%H:%M:%S'),
+        "items": [list(item) for item in items],
+        "subtotal": subtotal,
+        "gst": gst,
+        "grand_total": grand_total,
+    }
+
+
+class BillStore:
+    """Storage backend for issued bills."""
+
+    def add_bill(self, bill):
+        self.add_bills([bill])
+
+    def add_bills(self, bills):
+        raise NotImplementedError
+
+    def iter_bills(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SQLiteBillStore(BillStore):
+    """Bills in SQLite (WAL): one header row per bill plus normalized line items."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS bills (
+            bill_id TEXT PRIMARY KEY,
+            bill_date TEXT NOT NULL,
+            bill_time TEXT NOT NULL,
+            subtotal REAL NOT NULL,
+            gst REAL NOT NULL,
+            grand_total REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS bill_items (
+            bill_id TEXT NOT NULL REFERENCES bills(bill_id),
+            line_no INTEGER NOT NULL,
+            barcode TEXT NOT NULL,
+            name TEXT NOT NULL,
+            qty INTEGER NOT NULL,
+            unit_price REAL NOT NULL,
+            total REAL NOT NULL,
+            PRIMARY KEY (bill_id, line_no)
+        );
+        CREATE INDEX IF NOT EXISTS bills_by_date ON bills(bill_date, bill_time);
+        CREATE INDEX IF NOT EXISTS bill_items_by_barcode ON bill_items(barcode);
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+
+    def add_bills(self, bills):
+        with self.conn:
+            self._insert_bills(bills)
+        metrics.count("write", "bills db")
+
+    def _insert_bills(self, bills):
+        headers = []
+        lines = []
+        for bill in bills:
+            headers.append((bill["bill_id"], bill["date"], bill["time"],
+                            float(bill["subtotal"]), float(bill["gst"]), float(bill["grand_total"])))
+            for line_no, (barcode, name, qty, unit_price, total) in enumerate(bill["items"], 1):
+                lines.append((bill["bill_id"], line_no, str(barcode), str(name),
+                              int(qty), float(unit_price), float(total)))
+        self.conn.executemany("INSERT INTO bills VALUES (?, ?, ?, ?, ?, ?)", headers)
+        self.conn.executemany("INSERT INTO bill_items VALUES (?, ?, ?, ?, ?, ?, ?)", lines)
+
+    def iter_bills(self):
+        # Streams bills in issue order; line items are fetched with a second cursor
+        headers = self.conn.execute(
+            "SELECT bill_id, bill_date, bill_time, subtotal, gst, grand_total FROM bills ORDER BY rowid")
+        for bill_id, date, time, subtotal, gst, grand_total in headers:
+            items = self.conn.execute(
+                "SELECT barcode, name, qty, unit_price, total FROM bill_items WHERE bill_id = ? ORDER BY line_no",
+                (bill_id,)).fetchall()
+            yield {
+                "bill_id": bill_id,
+                "date": date,
+                "time": time,
+                "items": [list(item) for item in items],
+                "subtotal": subtotal,
+                "gst": gst,
+                "grand_total": grand_total,
+            }
+
+    def bill_count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM bills").fetchone()[0]
+
+    def line_count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM bill_items").fetchone()[0]
+
+    def iter_line_chunks(self, size):
+        # Every bill line joined with its bill header, fetched size rows at a time
+        cursor = self.conn.execute(
+            "SELECT b.bill_id, b.bill_date, b.bill_time, i.line_no, i.barcode, i.name, i.qty, i.unit_price,"
+            " i.total, b.subtotal, b.gst, b.grand_total"
+            " FROM bills b JOIN bill_items i ON i.bill_id = b.bill_id ORDER BY b.rowid, i.line_no")
+        while True:
+            rows = cursor.fetchmany(size)
+            if not rows:
+                break
+            yield rows
+
+    def backup(self, dest_path, progress=None):
+        # Copies 1024 pages per step so writers are not locked out for the whole copy
+        dest = sqlite3.connect(dest_path)
+        try:
+            if progress is None:
+                self.conn.backup(dest, pages=1024)
+            else:
+                self.conn.backup(dest, pages=1024,
+                                 progress=lambda status, remaining, total: progress(total - remaining, total))
+        finally:
+            dest.close()
+
+    def close(self):
+        self.conn.close()
+
+
+def bill_table_rows(bill):
+    # Header, line items and the three summary rows, as in the CSV export
+    rows = [list(BILL_COLUMNS)]
+    rows.extend(list(item) for item in bill["items"])
+    rows.append(["", "", "", "Subtotal", bill["subtotal"]])
+    rows.append(["", "", "", "GST", bill["gst"]])
+    rows.append(["", "", "", "Grand Total", bill["grand_total"]])
+    return rows
+
+
+def bill_sheet_rows(bill):
+    # Rows of one bill sheet exactly as the old generate_bill wrote them
+    rows = bill_table_rows(bill)
+    stamps = {6: ("Bill ID:", bill["bill_id"]), 7: ("Date:", bill["date"]), 8: ("Time:", bill["time"])}
+    for row_no, (label, value) in stamps.items():
+        while len(rows) < row_no:
+            rows.append([None] * len(BILL_COLUMNS))
+        rows[row_no - 1][0] = label
+        rows[row_no - 1][1] = value
+    return rows
+
+
+def export_bills_to_excel(store, path, progress=None):
+    # On-demand export to the legacy bills.xlsx layout (one sheet per bill)
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    total = store.bill_count() if progress is not None else None
+    count = 0
+    for bill in store.iter_bills():
+        ws = wb.create_sheet(f"Bill_{bill['bill_id']}")
+        for row in bill_sheet_rows(bill):
+            ws.append(row)
+        count += 1
+        if progress is not None and count % 100 == 0:
+            progress(count, total)
+    if count == 0:
+        wb.create_sheet("Sheet1")
+    wb.save(path)
+    metrics.count("write", "export", file_size(path))
+    return count
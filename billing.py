@@ -1,42 +1,86 @@
 import sys
-import uuid
-from datetime import datetime
+import time
+LAUNCH_START = time.perf_counter()
 from PyQt5 import QtWidgets, QtCore, QtGui
-import pandas as pd
-from openpyxl import load_workbook, Workbook
-
-try:
-    import qdarkstyle
-    THEME = True
-except ImportError:
-    THEME = False
+from cart import Cart
+from bill_store import SQLiteBillStore, bill_table_rows, export_bills_to_excel
+from export_stream import EXPORT_FILTERS, export_bill_lines, write_rows
+from io_worker import IOWorker
+from perf import configure_log, metrics
+from progress_dialog import run_with_progress
+from startup import LaunchTimer, cached_logo_pixmap, load_dark_stylesheet
+# pandas, numpy, openpyxl and the inventory and pricing modules are imported where first needed
 
 ITEMS_FILE = r"C:\Users\mohit\Documents\Coding\Project\BILLING_SOFTWARE\items.xlsx"
 BILLS_FILE = r"C:\Users\mohit\Documents\Coding\Project\BILLING_SOFTWARE\bills.xlsx"
+BILLS_DB = r"C:\Users\mohit\Documents\Coding\Project\BILLING_SOFTWARE\bills.db"
 LOGO_IMAGE = r"C:\Users\mohit\Documents\Coding\Project\BILLING_SOFTWARE\logo.jpg"
+CACHE_DIR = r"C:\Users\mohit\Documents\Coding\Project\BILLING_SOFTWARE\cache"
+BACKUP_DIR = r"C:\Users\mohit\Documents\Coding\Project\BILLING_SOFTWARE\backups"
+SEARCH_DELAY_MS = 150
+STOCK_RETRY_MS = 10_000
+METRICS_SUMMARY_MS = 60_000
+
+def read_inventory_snapshot(path):
+    # Runs on the I/O thread, so pandas is imported there rather than on the GUI thread
+    from inventory_store import read_snapshot
+    from pricing import GstRates
+    with metrics.span("inventory read"):
+        return read_snapshot(path), GstRates.for_items(path)
+
+def build_search_index(barcodes, names, layout_version, frame_version):
+    # Runs on the I/O thread; at 100k rows this takes longer than a keystroke may
+    from search_index import SearchIndex
+    with metrics.span("search index"):
+        return SearchIndex(barcodes, names, layout_version, frame_version)
 
 class BillingApp(QtWidgets.QWidget):
-    def __init__(self):
+    def __init__(self, launch_timer=None, server=None):
         super().__init__()
+        self.launch_timer = launch_timer
+        # Client mode: stock and bills live in inventory_server.py instead of local files
+        self.remote = None
+        if server:
+            from inventory_client import InventoryClient
+            from service_protocol import parse_address
+            self.remote = InventoryClient(parse_address(server))
+        self.logo = cached_logo_pixmap(LOGO_IMAGE, CACHE_DIR, 160, 80)
         self.setWindowTitle("Billing System")
-        self.setWindowIcon(QtGui.QIcon(LOGO_IMAGE))
+        self.setWindowIcon(QtGui.QIcon(self.logo))
         self.resize(900, 650)
-        try:
-            self.items_df = pd.read_excel(ITEMS_FILE)
-        except Exception as e:
-            QtWidgets.QMessageBox.critical(self, "Error", f"Failed to load inventory: {e}")
-            self.items_df = pd.DataFrame(columns=["Barcode", "Name", "Quantity", "Price"])
-        self.cart = []
+        # Created once the I/O thread has read items.xlsx
+        self.inventory = None
+        self.search = None
+        self.rates = None
+        self.feed = None
+        self.io = IOWorker(self)
+        self.writer = None
+        self.history = None
+        self.ledger = None
+        self.io_ledger = None
+        self.diagnostics = None
+        self.reload_pending = False
+        self.index_pending = False
+        self.cart = Cart()
         self.init_ui()
+        # Session timings go to the metrics log once a minute
+        self.metrics_timer = QtCore.QTimer(self)
+        self.metrics_timer.setInterval(METRICS_SUMMARY_MS)
+        self.metrics_timer.timeout.connect(lambda: metrics.log_summary("billing"))
+        self.metrics_timer.start()
+        # Stock changes of saved bills that could not be applied are retried until they are
+        self.stock_retry_timer = QtCore.QTimer(self)
+        self.stock_retry_timer.setSingleShot(True)
+        self.stock_retry_timer.setInterval(STOCK_RETRY_MS)
+        self.stock_retry_timer.timeout.connect(self.retry_stock)
+        self.reload_inventory()
 
     def init_ui(self):
         layout = QtWidgets.QVBoxLayout(self)
 
         # Logo at the top
         logo_label = QtWidgets.QLabel()
-        pixmap = QtGui.QPixmap(LOGO_IMAGE)
-        pixmap = pixmap.scaled(160, 80, QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation)
-        logo_label.setPixmap(pixmap)
+        logo_label.setPixmap(self.logo)
         logo_label.setAlignment(QtCore.Qt.AlignCenter)
         layout.addWidget(logo_label)
 
@@ -62,7 +106,11 @@ class BillingApp(QtWidgets.QWidget):
         filter_layout = QtWidgets.QHBoxLayout()
         self.search_input = QtWidgets.QLineEdit()
         self.search_input.setPlaceholderText("Search inventory by barcode or name...")
-        self.search_input.textChanged.connect(self.filter_inventory)
+        self.search_timer = QtCore.QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DELAY_MS)
+        self.search_timer.timeout.connect(self.filter_inventory)
+        self.search_input.textChanged.connect(self.search_timer.start)
         filter_layout.addWidget(QtWidgets.QLabel("Inventory Search:"))
         filter_layout.addWidget(self.search_input)
         layout.addLayout(filter_layout)
@@ -75,9 +123,20 @@ class BillingApp(QtWidgets.QWidget):
 
         # GST Checkbox
         gst_layout = QtWidgets.QHBoxLayout()
-        self.gst_checkbox = QtWidgets.QCheckBox("Include GST (18%)")
+        self.gst_checkbox = QtWidgets.QCheckBox("Include GST")
+        self.gst_checkbox.setToolTip("Charge each item's GST slab (by HSN code, 18% if none)")
+        self.gst_checkbox.stateChanged.connect(lambda _: self.update_terms())
         gst_layout.addWidget(self.gst_checkbox)
+        self.discount_input = QtWidgets.QDoubleSpinBox()
+        self.discount_input.setRange(0, 100)
+        self.discount_input.setSuffix("%")
+        self.discount_input.setToolTip("Discount on every line, before GST")
+        self.discount_input.valueChanged.connect(lambda _: self.update_terms())
+        gst_layout.addWidget(QtWidgets.QLabel("Discount:"))
+        gst_layout.addWidget(self.discount_input)
         gst_layout.addStretch()
+        self.status_label = QtWidgets.QLabel("Loading inventory...")
+        gst_layout.addWidget(self.status_label)
         layout.addLayout(gst_layout)
 
         # Total & Buttons
@@ -88,163 +147,457 @@ class BillingApp(QtWidgets.QWidget):
         self.gen_bill_btn.setToolTip("Generate and save bill")
         self.gen_bill_btn.clicked.connect(self.generate_bill)
         btn_layout.addWidget(self.gen_bill_btn)
+        self.clear_btn = QtWidgets.QPushButton("Clear Cart")
+        self.clear_btn.setToolTip("Empty the cart and give its reserved stock back")
+        self.clear_btn.clicked.connect(self.clear_cart)
+        btn_layout.addWidget(self.clear_btn)
         self.export_btn = QtWidgets.QPushButton("Export Bill as CSV")
         self.export_btn.setToolTip("Export current bill to CSV file")
         self.export_btn.clicked.connect(self.export_bill_csv)
         btn_layout.addWidget(self.export_btn)
-        self.backup_btn = QtWidgets.QPushButton("Backup Bills File")
-        self.backup_btn.setToolTip("Backup all bills Excel file")
-        self.backup_btn.clicked.connect(self.backup_bills)
+        self.export_bills_btn = QtWidgets.QPushButton("Export Bills")
+        self.export_bills_btn.setToolTip("Export all bills to Excel (one sheet per bill), CSV or JSON Lines")
+        self.export_bills_btn.clicked.connect(self.export_bills)
+        btn_layout.addWidget(self.export_bills_btn)
+        self.backup_btn = QtWidgets.QPushButton("Backup Bills")
+        self.backup_btn.setToolTip("Backup the bills database")
+        backup_menu = QtWidgets.QMenu(self.backup_btn)
+        backup_menu.addAction("Incremental Snapshot", self.snapshot_bills)
+        backup_menu.addAction("Full Copy...", self.backup_bills)
+        self.backup_btn.setMenu(backup_menu)
         btn_layout.addWidget(self.backup_btn)
+        self.report_btn = QtWidgets.QPushButton("Sales Report")
+        self.report_btn.setToolTip("Revenue per day, GST collected and top sellers")
+        self.report_btn.clicked.connect(self.show_sales_report)
+        btn_layout.addWidget(self.report_btn)
         layout.addLayout(btn_layout)
 
-    def filter_inventory(self):
-        text = self.search_input.text().lower()
+        # Hidden diagnostics panel
+        QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+Shift+D"), self, self.show_diagnostics)
+
+    def reload_inventory(self):
+        if self.remote is not None:
+            host, port = self.remote.address
+            self.status_label.setText(f"Connected to {host}:{port}")
+            if self.launch_timer is not None:
+                self.launch_timer.mark("inventory ready")
+                self.launch_timer.report(CACHE_DIR)
+            return
+        # items.xlsx is parsed on the I/O thread; the window stays responsive meanwhile
+        if self.reload_pending:
+            return
+        self.reload_pending = True
+        self.io.submit(read_inventory_snapshot, ITEMS_FILE, on_done=self.on_inventory_read, on_error=self.on_inventory_error)
+
+    @metrics.timed("inventory install")
+    def on_inventory_read(self, result):
+        self.reload_pending = False
+        snapshot, self.rates = result
         try:
-            self.items_df = pd.read_excel(ITEMS_FILE)
-        except Exception:
-            self.items_df = pd.DataFrame(columns=["Barcode", "Name", "Quantity", "Price"])
-        if text:
-            mask = self.items_df["Barcode"].astype(str).str.lower().str.contains(text) | self.items_df["Name"].astype(str).str.lower().str.contains(text)
-            filtered = self.items_df[mask]
-        else:
-            filtered = self.items_df
+            if self.inventory is None:
+                from change_feed import InventoryFeed
+                from inventory_store import InventoryStore
+                from search_index import InventorySearch
+                self.inventory = InventoryStore(ITEMS_FILE)
+                self.search = InventorySearch(self.inventory)
+                # Stock changes are pushed in as they happen; scans and searches read nothing
+                self.feed = InventoryFeed(self.inventory, self)
+                self.feed.rows_changed.connect(self.update_search_index)
+                self.feed.file_changed.connect(self.reload_inventory)
+            self.inventory.install(*snapshot)
+        except Exception as e:
+            self.on_inventory_error(str(e))
+            return
+        self.update_search_index()
+        self.status_label.setText(f"{len(self.inventory)} items loaded")
+        if self.launch_timer is not None:
+            self.launch_timer.mark("inventory ready")
+            self.launch_timer.report(CACHE_DIR)
+
+    def on_inventory_error(self, error):
+        self.reload_pending = False
+        self.status_label.setText("Inventory not loaded")
+        QtWidgets.QMessageBox.critical(self, "Error", f"Failed to load inventory: {error}")
+
+    def update_search_index(self):
+        # Rebuilt on the I/O thread after a load or a removed item; searches wait for it
+        if self.search.ready() or self.index_pending:
+            return
+        self.index_pending = True
+        self.io.submit(build_search_index, *self.search.source(), on_done=self.on_search_index_built,
+                       on_error=self.on_search_index_error)
+
+    def on_search_index_built(self, index):
+        self.index_pending = False
+        if not self.search.adopt(index):
+            # Items were removed or reloaded while it was built
+            self.update_search_index()
+            return
+        self.filter_inventory()
+
+    def on_search_index_error(self, error):
+        # Tried again on the next keystroke
+        self.index_pending = False
+
+    @metrics.timed("search")
+    def filter_inventory(self):
+        text = self.search_input.text()
+        if self.remote is not None:
+            try:
+                matches = self.remote.search(text, limit=2) if text.strip() else []
+            except Exception:
+                return
+            if len(matches) == 1:
+                self.barcode_input.setText(matches[0])
+            return
+        if self.inventory is None or not self.inventory.loaded:
+            return
+        if not self.search.ready():
+            self.update_search_index()
+            return
+        # Only need to know whether exactly one item matches
+        matches = self.search.search(text, limit=2) if text.strip() else []
         # Optionally, show filtered inventory in a dialog or update a table (not shown in main UI for simplicity)
         # For now, just update the barcode input if only one match
-        if len(filtered) == 1:
-            self.barcode_input.setText(str(filtered.iloc[0]["Barcode"]))
+        if len(matches) == 1:
+            self.barcode_input.setText(str(self.inventory.items_df["Barcode"].iat[matches[0]]))
 
     def add_item(self):
+        # Scan to display is timed for scans that reach the table only
+        start = time.perf_counter()
         barcode = self.barcode_input.text().strip()
         qty = self.qty_input.value()
+        if self.remote is not None:
+            if self.add_remote_item(barcode, qty):
+                metrics.record("scan to display", time.perf_counter() - start)
+            return
+        if self.inventory is None or not self.inventory.loaded:
+            QtWidgets.QMessageBox.warning(self, "Error", "Inventory is still loading, please wait.")
+            return
+        from inventory_store import StaleInventoryError, barcode_key
         try:
-            self.items_df = pd.read_excel(ITEMS_FILE)
+            # The stock check below must not trust a notification that may not have arrived
+            # (network drives); one indexed query catches up with every counter's sales
+            with metrics.span("journal sync"):
+                self.inventory.refresh_journal()
+        except StaleInventoryError:
+            # Sales this window never saw were compacted into items.xlsx; its stock cannot be trusted
+            self.reload_inventory()
+            QtWidgets.QMessageBox.warning(self, "Error", "Inventory changed on another counter and is being reloaded, please scan again.")
+            return
         except Exception as e:
             QtWidgets.QMessageBox.critical(self, "Error", f"Failed to load inventory: {e}")
             return
-        row = self.items_df[self.items_df['Barcode'].astype(str) == barcode]
-        if row.empty:
+        item = self.inventory.get(barcode)
+        if item is None:
             QtWidgets.QMessageBox.warning(self, "Error", "Item not found!")
             return
-        item = row.iloc[0]
         name, price, stock_qty = item['Name'], item['Price'], item['Quantity']
-        if qty > stock_qty:
-            QtWidgets.QMessageBox.warning(self, "Error", f"Not enough stock! Available: {stock_qty}")
+        # Held until the bill is saved or the cart is cleared; counts what is already in the cart
+        from reservations import ReservationError
+        try:
+            with metrics.span("reserve"):
+                self.reservations().reserve(self.cart.id, barcode_key(barcode), qty, stock_qty)
+        except ReservationError as e:
+            QtWidgets.QMessageBox.warning(self, "Error", str(e))
+            return
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, "Error", f"Failed to reserve stock: {e}")
+            return
+        from pricing import item_rate
+        line, is_new = self.cart.add(barcode, name, qty, price, item_rate(item, self.rates))
+        self.update_row(line, is_new)
+        self.update_total()
+        metrics.record("scan to display", time.perf_counter() - start)
+
+    def add_remote_item(self, barcode, qty):
+        # The server holds the stock for this counter until the bill is committed
+        from service_protocol import ServiceError
+        try:
+            with metrics.span("remote lookup"):
+                item = self.remote.lookup(barcode)
+            if item is None:
+                QtWidgets.QMessageBox.warning(self, "Error", "Item not found!")
+                return False
+            with metrics.span("reserve"):
+                self.remote.reserve(self.cart.id, barcode, qty)
+        except ServiceError as e:
+            QtWidgets.QMessageBox.warning(self, "Error", str(e))
+            return False
+        except OSError as e:
+            QtWidgets.QMessageBox.critical(self, "Error", f"Server not reachable: {e}")
+            return False
+        from pricing import DEFAULT_GST
+        line, is_new = self.cart.add(barcode, item['Name'], qty, item['Price'], item.get('GST', DEFAULT_GST))
+        self.update_row(line, is_new)
+        self.update_total()
+        return True
+
+    def reservations(self):
+        if self.ledger is None:
+            from reservations import ReservationLedger, ledger_path_for
+            self.ledger = ReservationLedger(ledger_path_for(ITEMS_FILE))
+        return self.ledger
+
+    def io_reservations(self):
+        # Only used from the I/O thread, which keeps its own ledger connection
+        if self.io_ledger is None:
+            from reservations import ReservationLedger, ledger_path_for
+            self.io_ledger = ReservationLedger(ledger_path_for(ITEMS_FILE))
+        return self.io_ledger
+
+    def release_cart(self, cart_id):
+        # Stale holds would expire on their own, so failures here are not fatal
+        try:
+            if self.remote is not None:
+                self.remote.release(cart_id)
+            else:
+                self.reservations().release(cart_id)
+        except Exception:
+            pass
+
+    def clear_cart(self):
+        if not self.cart:
             return
-        self.cart.append({'Barcode': barcode, 'Name': name, 'Qty': qty, 'Price': price})
+        self.release_cart(self.cart.id)
+        self.cart.clear()
         self.refresh_table()
 
-    def refresh_table(self):
-        self.table.setRowCount(0)
-        total = 0
-        for item in self.cart:
-            row = self.table.rowCount()
+    def update_row(self, line, is_new):
+        row = line["Row"]
+        if is_new:
             self.table.insertRow(row)
-            self.table.setItem(row, 0, QtWidgets.QTableWidgetItem(str(item["Barcode"])))
-            self.table.setItem(row, 1, QtWidgets.QTableWidgetItem(str(item["Name"])))
-            self.table.setItem(row, 2, QtWidgets.QTableWidgetItem(str(item["Qty"])))
-            price = item["Price"] * item["Qty"]
-            total += price
-            self.table.setItem(row, 3, QtWidgets.QTableWidgetItem(f"₹{price:.2f}"))
+            self.table.setItem(row, 0, QtWidgets.QTableWidgetItem(str(line["Barcode"])))
+            self.table.setItem(row, 1, QtWidgets.QTableWidgetItem(str(line["Name"])))
+        self.table.setItem(row, 2, QtWidgets.QTableWidgetItem(str(line["Qty"])))
+        self.table.setItem(row, 3, QtWidgets.QTableWidgetItem(f"₹{self.cart.line_total(line):.2f}"))
+
+    def update_terms(self):
+        # The only full reprice of the cart: GST and the discount apply to every line
+        if self.cart.set_terms(self.gst_checkbox.isChecked(), self.discount_input.value()):
+            self.refresh_table()
+
+    def update_total(self):
+        _, gst, total = self.cart.totals()
         if self.gst_checkbox.isChecked():
-            gst = total * 0.18
-            total += gst
-            self.total_label.setText(f"Total (GST included): ₹{total:.2f}")
+            self.total_label.setText(f"Total (GST ₹{gst:.2f} included): ₹{total:.2f}")
         else:
             self.total_label.setText(f"Total: ₹{total:.2f}")
 
+    @metrics.timed("refresh table")
+    def refresh_table(self):
+        self.table.setRowCount(0)
+        for line in self.cart:
+            self.update_row(line, True)
+        self.update_total()
+
+    @metrics.timed("bill queue")
     def generate_bill(self):
         if not self.cart:
             QtWidgets.QMessageBox.warning(self, "Error", "Cart is empty!")
             return
-        items = []
-        total = 0
-        for item in self.cart:
-            total_item = item['Price'] * item['Qty']
-            items.append([item['Barcode'], item['Name'], item['Qty'], item['Price'], total_item])
-            total += total_item
-        gst = 0
-        if self.gst_checkbox.isChecked():
-            gst = round(total * 0.18, 2)
-        grand_total = total + gst
+        bill = self.build_cart_bill()
+        cart_id = self.cart.id
+        # Persisted in the background so the next cart can start right away
+        self.io.submit(self.persist_bill, bill, self.gst_checkbox.isChecked(), self.discount_input.value(), cart_id,
+                       on_done=self.on_bill_saved,
+                       on_error=lambda error: self.on_bill_failed(bill, error, cart_id))
+        self.status_label.setText("Saving bill...")
+        self.cart.clear()
+        self.refresh_table()
+        self.barcode_input.clear()
+        self.qty_input.setValue(1)
+
+    def build_cart_bill(self):
+        # The same pricing as the cart total, so the bill matches the screen
+        from billing_engine import build_bill
+        return build_bill(self.cart.bill_lines(), self.gst_checkbox.isChecked(), discount_pct=self.discount_input.value())
 
-        bill_df = pd.DataFrame(items, columns=["Barcode", "Name", "Qty", "Unit Price", "Total"])
-        bill_df.loc[len(bill_df)] = ["", "", "", "Subtotal", total]
-        bill_df.loc[len(bill_df)] = ["", "", "", "GST (18%)", gst]
-        bill_df.loc[len(bill_df)] = ["", "", "", "Grand Total", grand_total]
+    @metrics.timed("bill commit")
+    def persist_bill(self, bill, include_gst=False, discount_pct=0, cart_id=None):
+        # Runs on the I/O thread, which keeps its own database connections
+        if self.remote is not None:
+            # The server releases the cart's reservations with the commit
+            return self.remote.commit(cart_id, [(barcode, qty) for barcode, _, qty, _, _ in bill["items"]],
+                                      include_gst, discount_pct), None
+        from billing_engine import BillingEngine, StockUpdateError
+        if self.writer is None:
+            from inventory_store import InventoryStore
+            self.writer = BillingEngine(InventoryStore(ITEMS_FILE), SQLiteBillStore(BILLS_DB))
+        if cart_id is not None:
+            self.confirm_holds(cart_id, bill)
+        try:
+            self.writer.commit([bill], key=cart_id)
+        except StockUpdateError as e:
+            # The bill is saved; the cart's holds keep its units from being sold again until the retry
+            return bill, str(e)
+        self.release_billed_cart(cart_id)
+        return bill, None
 
-        bill_id = datetime.now().strftime('%Y%m%d_%H%M%S') + "_" + str(uuid.uuid4())[:6]
-        sheet_name = f"Bill_{bill_id}"
+    def confirm_holds(self, cart_id, bill):
+        # A cart left idle past the reservation TTL lost its holds: take them
+        # again against the current stock, or refuse the bill
+        from billing_engine import BillingError, stock_deltas
+        inventory = self.writer.inventory
+        inventory.refresh()
+        wanted = []
+        for key, delta in stock_deltas([bill]).items():
+            item = inventory.get(key)
+            if item is None:
+                raise BillingError(f"Item not found: {key}")
+            wanted.append((key, -delta, item["Quantity"]))
+        self.io_reservations().confirm(cart_id, wanted)
 
+    def release_billed_cart(self, cart_id):
+        # Released in the commit job, so the holds go even if the window closes before on_bill_saved
+        if cart_id is None:
+            return
         try:
-            with pd.ExcelWriter(BILLS_FILE, engine='openpyxl', mode='a', if_sheet_exists='new') as writer:
-                bill_df.to_excel(writer, sheet_name=sheet_name, index=False)
-            wb = load_workbook(BILLS_FILE)
-            ws = wb[sheet_name]
-            ws["A6"] = "Bill ID:"
-            ws["B6"] = bill_id
-            ws["A7"] = "Date:"
-            ws["B7"] = datetime.now().strftime('%Y-%m-%d')
-            ws["A8"] = "Time:"
-            ws["B8"] = datetime.now().strftime('%H:%M:%S')
-            wb.save(BILLS_FILE)
-            # Reduce stock in inventory
-            for item in self.cart:
-                idx = self.items_df[self.items_df['Barcode'].astype(str) == item['Barcode']].index
-                if not idx.empty:
-                    self.items_df.at[idx[0], 'Quantity'] -= item['Qty']
-            self.items_df.to_excel(ITEMS_FILE, index=False)
-            QtWidgets.QMessageBox.information(self, "Success", f"Bill generated (Sheet: {sheet_name})")
-        except Exception as e:
-            QtWidgets.QMessageBox.critical(self, "Error", f"Failed to generate bill: {e}")
-        finally:
-            self.cart = []
-            self.refresh_table()
-            self.barcode_input.clear()
-            self.qty_input.setValue(1)
+            self.io_reservations().release(cart_id)
+        except Exception:
+            # Stale holds expire on their own
+            pass
+
+    @metrics.timed("stock retry")
+    def persist_pending_stock(self):
+        # Runs on the I/O thread
+        if self.writer is not None:
+            self.writer.retry_pending(self.release_billed_cart)
+
+    def retry_stock(self):
+        self.io.submit(self.persist_pending_stock,
+                       on_done=lambda _: self.status_label.setText("Stock updated for all saved bills"),
+                       on_error=lambda error: self.stock_retry_timer.start())
+
+    def on_bill_saved(self, result):
+        bill, stock_error = result
+        if self.feed is not None:
+            self.feed.check()
+        if stock_error:
+            self.status_label.setText(f"Bill {bill['bill_id']} saved, stock update pending")
+            QtWidgets.QMessageBox.warning(self, "Stock Not Updated",
+                                          f"Bill {bill['bill_id']} was saved. {stock_error}\n\n"
+                                          "The stock update is retried in the background; do not bill these items again.")
+            self.stock_retry_timer.start()
+            return
+        self.status_label.setText(f"Bill generated (Bill ID: {bill['bill_id']})")
+
+    def on_bill_failed(self, bill, error, cart_id=None):
+        if cart_id is not None:
+            self.release_cart(cart_id)
+        self.status_label.setText(f"Bill {bill['bill_id']} not saved")
+        QtWidgets.QMessageBox.critical(self, "Error", f"Failed to generate bill {bill['bill_id']}: {error}")
 
     def export_bill_csv(self):
         if not self.cart:
             QtWidgets.QMessageBox.warning(self, "Error", "Cart is empty!")
             return
-        items = []
-        total = 0
-        for item in self.cart:
-            total_item = item['Price'] * item['Qty']
-            items.append([item['Barcode'], item['Name'], item['Qty'], item['Price'], total_item])
-            total += total_item
-        gst = 0
-        if self.gst_checkbox.isChecked():
-            gst = round(total * 0.18, 2)
-        grand_total = total + gst
-        bill_df = pd.DataFrame(items, columns=["Barcode", "Name", "Qty", "Unit Price", "Total"])
-        bill_df.loc[len(bill_df)] = ["", "", "", "Subtotal", total]
-        bill_df.loc[len(bill_df)] = ["", "", "", "GST (18%)", gst]
-        bill_df.loc[len(bill_df)] = ["", "", "", "Grand Total", grand_total]
+        rows = bill_table_rows(self.build_cart_bill())
         save_path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Export Bill as CSV", "bill.csv", "CSV Files (*.csv)")
         if save_path:
             try:
-                bill_df.to_csv(save_path, index=False)
+                write_rows(save_path, rows[0], [rows[1:]])
                 QtWidgets.QMessageBox.information(self, "Success", f"Bill exported to {save_path}")
             except Exception as e:
                 QtWidgets.QMessageBox.critical(self, "Error", f"Failed to export bill: {e}")
 
+    def export_bills(self):
+        save_path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Export Bills", "bills.xlsx", "Excel Files (*.xlsx);;" + EXPORT_FILTERS)
+        if save_path:
+            run_with_progress(self, self.io, "Exporting bills...", self.write_bills_export, save_path,
+                              on_done=lambda count: self.on_bills_exported(save_path, count),
+                              on_error=lambda error: QtWidgets.QMessageBox.critical(self, "Error", f"Failed to export bills: {error}"))
+
+    @metrics.timed("export")
+    def write_bills_export(self, path, progress=None):
+        # Runs on the I/O thread: bills are streamed from the database cursor
+        if path.lower().endswith(".xlsx"):
+            return export_bills_to_excel(self.history_store(), path, progress)
+        return export_bill_lines(self.history_store(), path, progress)
+
+    def on_bills_exported(self, path, count):
+        # Excel gets one sheet per bill, the other formats one row per bill line
+        what = "bills" if path.lower().endswith(".xlsx") else "bill lines"
+        QtWidgets.QMessageBox.information(self, "Success", f"{count} {what} exported to {path}")
+
     def backup_bills(self):
-        import shutil
-        try:
-            backup_path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Backup Bills Excel File", "bills_backup.xlsx", "Excel Files (*.xlsx)")
-            if backup_path:
-                shutil.copy2(BILLS_FILE, backup_path)
-                QtWidgets.QMessageBox.information(self, "Success", f"Backup created at {backup_path}")
-        except Exception as e:
-            QtWidgets.QMessageBox.critical(self, "Error", f"Failed to backup: {e}")
+        backup_path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Backup Bills Database", "bills_backup.db", "SQLite Database (*.db)")
+        if backup_path:
+            run_with_progress(self, self.io, "Backing up bills...", self.persist_backup, backup_path,
+                              on_done=lambda _: QtWidgets.QMessageBox.information(self, "Success", f"Backup created at {backup_path}"),
+                              on_error=lambda error: QtWidgets.QMessageBox.critical(self, "Error", f"Failed to backup: {error}"))
+
+    @metrics.timed("backup")
+    def persist_backup(self, backup_path, progress=None):
+        self.history_store().backup(backup_path, progress)
+
+    def snapshot_bills(self):
+        # Only the pages that changed since the last snapshot are stored
+        run_with_progress(self, self.io, "Backing up bills...", self.persist_snapshot,
+                          on_done=lambda manifest: QtWidgets.QMessageBox.information(
+                              self, "Success", f"Snapshot {manifest['name']} created in {BACKUP_DIR} "
+                                               f"({manifest['stored_bytes'] // 1024} KB new)"),
+                          on_error=lambda error: QtWidgets.QMessageBox.critical(self, "Error", f"Failed to backup: {error}"))
+
+    @metrics.timed("snapshot")
+    def persist_snapshot(self, progress=None):
+        from backup_store import SnapshotStore, snapshot_sqlite
+        return snapshot_sqlite(SnapshotStore(BACKUP_DIR, compress=True), [BILLS_DB], "bills", progress)
+
+    def history_store(self):
+        # Only used from the I/O thread, like the bill writer
+        if self.history is None:
+            from bill_history import BillHistory
+            self.history = BillHistory(BILLS_DB)
+        return self.history
+
+    def show_sales_report(self):
+        from report_dialog import SalesReportDialog
+        SalesReportDialog(self, self.io, self.history_store, BILLS_FILE).exec_()
+
+    def show_diagnostics(self):
+        from diagnostics_dialog import DiagnosticsDialog
+        if self.diagnostics is None:
+            self.diagnostics = DiagnosticsDialog(self, CACHE_DIR)
+        self.diagnostics.show()
+        self.diagnostics.raise_()
+
+    def closeEvent(self, event):
+        if self.feed is not None:
+            self.feed.stop()
+        # Wait for bills still queued on the I/O thread, with one last try at pending stock
+        self.io.submit(self.persist_pending_stock)
+        self.io.stop()
+        if self.writer is not None and self.writer.pending:
+            lines = [f"{barcode}: {delta:+d}" for _, deltas in self.writer.pending for barcode, delta in deltas.items()]
+            QtWidgets.QMessageBox.warning(self, "Stock Not Updated",
+                                          "These stock changes of saved bills could not be applied; "
+                                          "please correct them in the inventory:\n" + "\n".join(lines))
+        metrics.log_summary("billing")
+        if self.cart:
+            self.release_cart(self.cart.id)
+        if self.remote is not None:
+            self.remote.close()
+        super().closeEvent(event)
 
 def main():
-    app = QtWidgets.QApplication(sys.argv)
-    if THEME:
-        app.setStyleSheet(qdarkstyle.load_stylesheet_pyqt5())
-    window = BillingApp()
+    timer = LaunchTimer("billing", start=LAUNCH_START)
+    timer.mark("imports")
+    import argparse
+    parser = argparse.ArgumentParser(description="Billing counter.")
+    parser.add_argument("--server", help="host:port of inventory_server.py; without it items.xlsx is used directly")
+    args, qt_args = parser.parse_known_args()
+    configure_log(CACHE_DIR)
+    app = QtWidgets.QApplication(sys.argv[:1] + qt_args)
+    timer.mark("qt application")
+    stylesheet = load_dark_stylesheet(CACHE_DIR)
+    if stylesheet:
+        app.setStyleSheet(stylesheet)
+    timer.mark("stylesheet")
+    window = BillingApp(launch_timer=timer, server=args.server)
+    timer.mark("window built")
     window.show()
+    timer.mark("window shown")
     sys.exit(app.exec_())
 
 if __name__ == '__main__':
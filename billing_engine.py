@@ -0,0 +1,235 @@
+import argparse
+import csv
+import json
+import sys
+import time
+from datetime import datetime
+from bill_store import make_bill, new_bill_id
+from pricing import GstRates, PricingError, item_rate, price_bills, to_basis_points
+
+
+class BillingError(Exception):
+    pass
+
+
+class StockUpdateError(BillingError):
+    """The bills were saved but the stock was not updated.
+
+    Billing them again would sell the items twice; the stock change waits
+    in BillingEngine.pending for retry_pending() instead.
+    """
+
+    def __init__(self, count, error):
+        super().__init__(f"{count} bill(s) saved, but the stock was not updated: {error}")
+
+
+def price_lines(lines, include_gst, discount_pct=0):
+    # lines: iterable of (barcode, name, qty, unit_price[, gst_percent])
+    return price_bills([list(lines)], include_gst, discount_pct)[0]
+
+
+def build_bill(lines, include_gst, now=None, discount_pct=0):
+    items, subtotal, gst, grand_total = price_lines(lines, include_gst, discount_pct)
+    return make_bill(items, subtotal, gst, grand_total, now)
+
+
+def stock_deltas(bills):
+    # One quantity change per barcode for any number of bills
+    from inventory_store import barcode_key
+    deltas = {}
+    for bill in bills:
+        for barcode, _, qty, _, _ in bill["items"]:
+            key = barcode_key(barcode)
+            deltas[key] = deltas.get(key, 0) - int(qty)
+    return deltas
+
+
+class BillingEngine:
+    """Pricing, stock validation and persistence of bills without any GUI.
+
+    Orders are dicts like {"items": [{"barcode": ..., "qty": ...}], "gst": bool,
+    "discount": optional percent, "timestamp": optional ISO time}; names,
+    prices and GST slabs come from the inventory and its HSN rates. With a
+    reservation ledger, stock held by open carts is not sold to a batch.
+    """
+
+    def __init__(self, inventory, bill_store, rates=None, ledger=None):
+        self.inventory = inventory
+        self.bill_store = bill_store
+        self.ledger = ledger
+        self.rates = rates if rates is not None else GstRates.for_items(inventory.path)
+        # (key, deltas) of saved bills whose stock change failed, oldest first
+        self.pending = []
+
+    def order_lines(self, order):
+        # (barcode, name, qty, unit_price, gst_percent) for each line of order
+        lines = []
+        for entry in order.get("items", []):
+            barcode = str(entry["barcode"]).strip()
+            qty = int(entry["qty"])
+            if qty <= 0:
+                raise BillingError(f"Invalid quantity {qty} for barcode {barcode}")
+            item = self.inventory.get(barcode)
+            if item is None:
+                raise BillingError(f"Item not found: {barcode}")
+            lines.append((barcode, item["Name"], qty, float(item["Price"]), item_rate(item, self.rates)))
+        if not lines:
+            raise BillingError("Order has no items")
+        return lines
+
+    def order_time(self, order):
+        # The order's timestamp as a datetime, or None to bill it now
+        timestamp = order.get("timestamp")
+        if not timestamp:
+            return None
+        try:
+            return datetime.fromisoformat(str(timestamp))
+        except ValueError:
+            raise BillingError(f"Invalid timestamp {timestamp!r}") from None
+
+    def price(self, orders, lines, times):
+        # Bills for orders whose lines and times are already validated, priced in one pass
+        try:
+            priced = price_bills(lines, [bool(order.get("gst")) for order in orders],
+                                 [float(order.get("discount") or 0) for order in orders])
+        except PricingError as e:
+            raise BillingError(str(e)) from e
+        return [make_bill(items, subtotal, gst, grand_total, now)
+                for now, (items, subtotal, gst, grand_total) in zip(times, priced)]
+
+    def prepare(self, order):
+        return self.price([order], [self.order_lines(order)], [self.order_time(order)])[0]
+
+    def prepare_batch(self, orders, skip_invalid=False):
+        # Returns (bills, rejected). Stock is checked against the combined
+        # demand of the batch, so N bills cannot together oversell an item.
+        self.inventory.refresh()
+        if self.ledger is not None:
+            self.ledger.expire()
+        from inventory_store import barcode_key
+        remaining = {}
+        accepted = []
+        accepted_lines = []
+        accepted_times = []
+        rejected = []
+        for number, order in enumerate(orders, 1):
+            try:
+                lines = self.order_lines(order)
+                now = self.order_time(order)
+                # Pricing itself happens once for the whole batch below
+                to_basis_points(float(order.get("discount") or 0))
+                demand = {}
+                for barcode, _, qty, _, _ in lines:
+                    key = barcode_key(barcode)
+                    demand[key] = demand.get(key, 0) - qty
+                for barcode, delta in demand.items():
+                    if barcode not in remaining:
+                        remaining[barcode] = int(self.inventory.get(barcode)["Quantity"])
+                        if self.ledger is not None:
+                            remaining[barcode] -= self.ledger.held_by_others(None, barcode)
+                    if remaining[barcode] + delta < 0:
+                        raise BillingError(f"Not enough stock for {barcode}! Available: {remaining[barcode]}")
+            except (BillingError, KeyError, ValueError) as e:
+                if not skip_invalid:
+                    raise BillingError(f"Order {order.get('order_id', number)}: {e}") from e
+                rejected.append((order.get("order_id", number), str(e)))
+                continue
+            for barcode, delta in demand.items():
+                remaining[barcode] += delta
+            accepted.append(order)
+            accepted_lines.append(lines)
+            accepted_times.append(now)
+        bills = []
+        seen_ids = set()
+        for bill in self.price(accepted, accepted_lines, accepted_times):
+            # Bills issued in the same second only differ by a short random suffix
+            while bill["bill_id"] in seen_ids:
+                bill["bill_id"] = new_bill_id(datetime.strptime(f"{bill['date']} {bill['time']}", "%Y-%m-%d %H:%M:%S"))
+            seen_ids.add(bill["bill_id"])
+            bills.append(bill)
+        return bills, rejected
+
+    def commit(self, bills, key=None):
+        # All bill records in one transaction, then all stock decrements in one.
+        # The two are separate databases: if the stock fails the bills stay saved
+        # and the deltas are kept, under key, for retry_pending().
+        if not bills:
+            return
+        self.bill_store.add_bills(bills)
+        deltas = stock_deltas(bills)
+        try:
+            self.inventory.apply_deltas(deltas)
+        except Exception as e:
+            self.pending.append((key, deltas))
+            raise StockUpdateError(len(bills), e) from e
+
+    def retry_pending(self, applied=None):
+        # Applies kept stock changes oldest first, calling applied(key) after each
+        while self.pending:
+            key, deltas = self.pending[0]
+            self.inventory.apply_deltas(deltas)
+            self.pending.pop(0)
+            if applied is not None:
+                applied(key)
+
+    def process_batch(self, orders, skip_invalid=False):
+        bills, rejected = self.prepare_batch(orders, skip_invalid)
+        self.commit(bills)
+        return bills, rejected
+
+
+def read_orders(path):
+    # JSONL: one order per line. CSV: one line item per row with columns
+    # order_id, barcode, qty and optionally gst, discount and timestamp.
+    if path.lower().endswith(".csv"):
+        orders = {}
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                order = orders.setdefault(row["order_id"], {
+                    "order_id": row["order_id"],
+                    "gst": str(row.get("gst", "")).strip().lower() in ("1", "true", "yes", "y"),
+                    "discount": row.get("discount") or 0,
+                    "timestamp": row.get("timestamp") or None,
+                    "items": [],
+                })
+                order["items"].append({"barcode": row["barcode"], "qty": row["qty"]})
+        return list(orders.values())
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a CSV/JSONL file of orders as bills.")
+    parser.add_argument("orders", help="orders file (.csv or .jsonl)")
+    parser.add_argument("--items", default="items.xlsx", help="inventory Excel file")
+    parser.add_argument("--bills-db", default="bills.db", help="bills database")
+    parser.add_argument("--skip-invalid", action="store_true", help="skip invalid orders instead of aborting")
+    parser.add_argument("--dry-run", action="store_true", help="validate only, write nothing")
+    args = parser.parse_args(argv)
+
+    from inventory_store import InventoryStore
+    from bill_store import SQLiteBillStore
+    from reservations import ReservationLedger, ledger_path_for
+
+    engine = BillingEngine(InventoryStore(args.items), SQLiteBillStore(args.bills_db),
+                           ledger=ReservationLedger(ledger_path_for(args.items)))
+    orders = read_orders(args.orders)
+    start = time.perf_counter()
+    try:
+        bills, rejected = engine.prepare_batch(orders, args.skip_invalid)
+        if not args.dry_run:
+            engine.commit(bills)
+    except BillingError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    elapsed = time.perf_counter() - start
+    for order_id, reason in rejected:
+        print(f"Rejected order {order_id}: {reason}", file=sys.stderr)
+    rate = len(bills) / elapsed if elapsed else float("inf")
+    action = "Validated" if args.dry_run else "Replayed"
+    print(f"{action} {len(bills)} bills ({len(rejected)} rejected) in {elapsed:.2f} s ({rate:.0f} bills/s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,229 @@
+import argparse
+import csv
+import os
+import sys
+import pandas as pd
+from inventory_store import barcode_key
+
+CHUNK_ROWS = 5000
+IMPORT_FILTERS = "Supplier Files (*.csv *.xlsx);;CSV Files (*.csv);;Excel Files (*.xlsx)"
+# Header spellings seen in supplier files, matched case-insensitively
+COLUMN_ALIASES = {
+    "barcode": "Barcode", "ean": "Barcode", "code": "Barcode",
+    "name": "Name", "item": "Name", "description": "Name",
+    "quantity": "Quantity", "qty": "Quantity",
+    "price": "Price", "rate": "Price", "mrp": "Price",
+}
+REPORT_COLUMNS = ["Row", "Barcode", "Issue", "Detail"]
+
+
+def normalize_columns(columns):
+    renamed = [COLUMN_ALIASES.get(str(col).strip().lower(), str(col).strip()) for col in columns]
+    missing = {"Barcode", "Quantity"} - set(renamed)
+    if missing:
+        raise ValueError(f"The file must have Barcode and Quantity columns (missing: {', '.join(sorted(missing))})")
+    return renamed
+
+
+def read_chunks(path, size=CHUNK_ROWS):
+    """Yields the supplier file as DataFrames of up to size rows, all cells as text.
+
+    CSV is read by pandas a chunk at a time; Excel through openpyxl's
+    read-only mode, so neither is ever fully in memory.
+    """
+    if path.lower().endswith(".csv"):
+        reader = pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=size, skipinitialspace=True)
+        for chunk in reader:
+            chunk.columns = normalize_columns(chunk.columns)
+            yield chunk
+        return
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = normalize_columns(header)
+        batch = []
+        for row in rows:
+            batch.append(["" if value is None else str(value) for value in row])
+            if len(batch) == size:
+                yield pd.DataFrame(batch, columns=columns)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=columns)
+    finally:
+        wb.close()
+
+
+def validate_chunk(chunk, first_row):
+    """Splits one chunk into clean rows and issues, without a per-row loop.
+
+    Returns (clean, issues): clean has Row, Barcode, Name, Quantity and
+    Price (NaN when blank); issues are (row, barcode, issue, detail).
+    Row numbers count the header as row 1, like a spreadsheet.
+    """
+    rows = pd.RangeIndex(first_row, first_row + len(chunk))
+    barcode = chunk["Barcode"].map(barcode_key).to_numpy()
+    name = chunk["Name"].str.strip().to_numpy() if "Name" in chunk else [""] * len(chunk)
+    qty_text = chunk["Quantity"].str.strip()
+    qty = pd.to_numeric(qty_text, errors="coerce")
+    price_text = chunk["Price"].str.strip() if "Price" in chunk else pd.Series([""] * len(chunk), index=chunk.index)
+    price = pd.to_numeric(price_text.str.lstrip("₹"), errors="coerce")
+    clean = pd.DataFrame({"Row": rows, "Barcode": barcode, "Name": name, "Quantity": qty.to_numpy(),
+                          "Price": price.to_numpy()})
+
+    problems = [
+        (clean["Barcode"] == "", "Barcode is empty"),
+        (qty.isna().to_numpy(), "Quantity is not a number"),
+        (((qty < 0) | (qty % 1 != 0)).to_numpy(), "Quantity must be a whole number of at least 0"),
+        (((price_text != "").to_numpy() & ~(price > 0).to_numpy()), "Price must be a number above 0"),
+    ]
+    bad = pd.Series(False, index=clean.index)
+    issues = []
+    for mask, detail in problems:
+        mask = pd.Series(mask, index=clean.index) & ~bad
+        for row, code in clean.loc[mask, ["Row", "Barcode"]].itertuples(index=False):
+            issues.append((row, code, "invalid", detail))
+        bad |= mask
+    clean = clean[~bad]
+    clean = clean.astype({"Quantity": "int64"})
+    return clean, issues
+
+
+def plan_import(store, path, progress=None):
+    """Reads and checks a supplier file against store; writes nothing.
+
+    Rows for the same barcode are merged (quantities added, the last
+    price kept) and reported as duplicates. A name that differs from the
+    inventory's is reported as a conflict and the inventory name kept.
+    New items need a name and a price. Returns (plan, report) where plan
+    holds (barcode, name, qty, price) for InventoryStore.upsert_many.
+    """
+    parts = []
+    issues = []
+    total_rows = 0
+    for chunk in read_chunks(path):
+        clean, chunk_issues = validate_chunk(chunk, total_rows + 2)
+        parts.append(clean)
+        issues.extend(chunk_issues)
+        total_rows += len(chunk)
+        if progress is not None:
+            progress(total_rows, None)
+    rows = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(
+        columns=["Row", "Barcode", "Name", "Quantity", "Price"])
+
+    # Duplicated barcodes, and duplicates that disagree on the price
+    counts = rows["Barcode"].value_counts()
+    repeated = rows[rows["Barcode"].isin(counts.index[counts > 1])]
+    for code, group in repeated.groupby("Barcode", sort=False):
+        row_list = ", ".join(str(row) for row in group["Row"])
+        issues.append((int(group["Row"].iat[0]), code, "duplicate", f"Rows {row_list} merged"))
+        prices = group["Price"].dropna().unique()
+        if len(prices) > 1:
+            issues.append((int(group["Row"].iat[-1]), code, "conflict",
+                           f"Prices {', '.join(f'{p:g}' for p in prices)}; the last one is used"))
+
+    by_barcode = rows.groupby("Barcode", sort=False)
+    merged = pd.DataFrame({
+        "Row": by_barcode["Row"].first(),
+        "Name": rows["Name"].where(rows["Name"] != "").groupby(rows["Barcode"], sort=False).first(),
+        "Quantity": by_barcode["Quantity"].sum(),
+        "Price": by_barcode["Price"].last(),
+    })
+
+    store.refresh()
+    df = store.items_df
+    positions = merged.index.map(store.index.get)
+    known = positions.notna()
+    existing = merged[known].copy()
+    pos = positions[known].to_numpy(dtype="int64")
+    existing["Current Name"] = df["Name"].to_numpy()[pos]
+    existing["Current Price"] = df["Price"].to_numpy(dtype=float)[pos]
+    renamed = existing["Name"].notna() & (
+        existing["Name"].str.casefold() != existing["Current Name"].astype(str).str.strip().str.casefold())
+    for code, row, supplier, current in existing.loc[renamed, ["Row", "Name", "Current Name"]].itertuples():
+        issues.append((int(row), code, "conflict", f"Name '{supplier}' differs from inventory '{current}'; kept"))
+    repriced = int((existing["Price"].notna() & (existing["Price"] != existing["Current Price"])).sum())
+
+    added = merged[~known]
+    incomplete = added["Name"].isna() | added["Price"].isna()
+    for code, row in added.loc[incomplete, "Row"].items():
+        issues.append((int(row), code, "invalid", "New item needs a name and a price"))
+    added = added[~incomplete]
+
+    plan = [(code, name, int(qty), None if pd.isna(price) else float(price))
+            for code, name, qty, price in zip(existing.index, existing["Current Name"], existing["Quantity"],
+                                              existing["Price"])]
+    plan += [(code, name, int(qty), float(price))
+             for code, name, qty, price in zip(added.index, added["Name"], added["Quantity"], added["Price"])]
+    report = {
+        "rows": total_rows,
+        "updated": len(existing),
+        "added": len(added),
+        "repriced": repriced,
+        "quantity": int(existing["Quantity"].sum() + added["Quantity"].sum()),
+        "issues": sorted(issues),
+    }
+    return plan, report
+
+
+def import_inventory(store, path, progress=None, dry_run=False):
+    # Everything lands in one journal batch, so other counters see all of it or none
+    plan, report = plan_import(store, path, progress)
+    if plan and not dry_run:
+        if progress is not None:
+            # Last chance to cancel; nothing has been written yet
+            progress(report["rows"], report["rows"])
+        store.upsert_many(plan)
+    return report
+
+
+def write_report(report, path):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(REPORT_COLUMNS)
+        writer.writerows(report["issues"])
+
+
+def report_path_for(path):
+    return os.path.splitext(path)[0] + "_import_report.csv"
+
+
+def summary(report):
+    kinds = {}
+    for _, _, kind, _ in report["issues"]:
+        kinds[kind] = kinds.get(kind, 0) + 1
+    text = (f"{report['rows']} rows: {report['updated']} items updated ({report['repriced']} repriced), "
+            f"{report['added']} added, {report['quantity']} units in total.")
+    if kinds:
+        text += " Issues: " + ", ".join(f"{count} {kind}" for kind, count in sorted(kinds.items())) + "."
+    return text
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Merge a supplier CSV/Excel file into the inventory.")
+    parser.add_argument("supplier", help="supplier file (.csv or .xlsx) with Barcode, Quantity and optionally Name, Price")
+    parser.add_argument("--items", default="items.xlsx", help="inventory Excel file")
+    parser.add_argument("--dry-run", action="store_true", help="check and report only, write nothing")
+    parser.add_argument("--report", help="issues CSV (default: <supplier>_import_report.csv when there are issues)")
+    args = parser.parse_args(argv)
+
+    from inventory_store import InventoryStore
+    store = InventoryStore(args.items)
+    try:
+        report = import_inventory(store, args.supplier, dry_run=args.dry_run)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print(("Dry run: " if args.dry_run else "") + summary(report))
+    if report["issues"] or args.report:
+        report_path = args.report or report_path_for(args.supplier)
+        write_report(report, report_path)
+        print(f"Issues written to {report_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+import uuid
+
+
+class Cart:
+    """Cart lines keyed by barcode, with running totals in paise.
+
+    Scanning a barcode already in the cart adds to its line, so each scan
+    touches one table row and reprices one line with pricing.py. Lines are
+    rounded to the paisa on their own, so the totals are plain running sums
+    and the saved bill, priced by price_bills, agrees to the paisa. Only a
+    change of the GST toggle or the discount reprices every line. Every new
+    cart gets a fresh id, which its stock reservations are held under.
+    """
+
+    def __init__(self):
+        self.lines = {}
+        self.id = uuid.uuid4().hex[:12]
+        self.include_gst = False
+        self.discount_bp = 0
+        self.taxable = 0
+        self.tax = 0
+
+    def add(self, barcode, name, qty, price, gst):
+        # Returns (line, is_new); line["Row"] is the line's row in the cart table
+        line = self.lines.get(barcode)
+        is_new = line is None
+        if is_new:
+            # numpy is already loaded by the time there is a cart to price
+            from pricing import check_slabs, to_paise
+            line = {"Barcode": barcode, "Name": name, "Qty": 0, "Price": price, "GST": int(check_slabs([gst])[0]),
+                    "Paise": int(to_paise(price)), "Taxable": 0, "Tax": 0, "Row": len(self.lines)}
+            self.lines[barcode] = line
+        line["Qty"] += qty
+        self._reprice([line])
+        return line, is_new
+
+    def set_terms(self, include_gst, discount_pct=0):
+        # Returns True when the terms changed and every line was repriced
+        from pricing import to_basis_points
+        include_gst = bool(include_gst)
+        discount_bp = int(to_basis_points(discount_pct))
+        if include_gst == self.include_gst and discount_bp == self.discount_bp:
+            return False
+        self.include_gst = include_gst
+        self.discount_bp = discount_bp
+        self._reprice(list(self))
+        return True
+
+    def _reprice(self, lines):
+        # Moves the running totals by the difference each line's new amounts make
+        if not lines:
+            return
+        from pricing import price_arrays
+        _, _, taxable, tax = price_arrays([line["Qty"] for line in lines], [line["Paise"] for line in lines],
+                                          [line["GST"] for line in lines], self.discount_bp, self.include_gst)
+        for line, line_taxable, line_tax in zip(lines, taxable.tolist(), tax.tolist()):
+            self.taxable += line_taxable - line["Taxable"]
+            self.tax += line_tax - line["Tax"]
+            line["Taxable"] = line_taxable
+            line["Tax"] = line_tax
+
+    def quantity(self, barcode):
+        line = self.lines.get(barcode)
+        return line["Qty"] if line else 0
+
+    def line_total(self, line):
+        # After the discount and before GST, in rupees
+        return line["Taxable"] / 100
+
+    def totals(self):
+        # (subtotal, gst, grand_total) in rupees
+        return self.taxable / 100, self.tax / 100, (self.taxable + self.tax) / 100
+
+    def bill_lines(self):
+        # (barcode, name, qty, unit_price, gst_percent) as build_bill takes them
+        return [(line["Barcode"], line["Name"], line["Qty"], line["Price"], line["GST"]) for line in self]
+
+    def clear(self):
+        self.lines = {}
+        self.id = uuid.uuid4().hex[:12]
+        self.taxable = 0
+        self.tax = 0
+
+    def __iter__(self):
+        return iter(self.lines.values())
+
+    def __len__(self):
+        return len(self.lines)
@@ -0,0 +1,99 @@
+import os
+from PyQt5 import QtCore
+from inventory_store import StaleInventoryError, journal_path_for
+from perf import metrics
+
+# Bursts of notifications (a commit touches the journal and its -wal) are read once
+WATCH_DELAY_MS = 20
+# Safety net for notifications the OS never sends, e.g. on network drives
+FALLBACK_POLL_MS = 5_000
+
+
+class InventoryFeed(QtCore.QObject):
+    """Pushes inventory changes from any counter to one InventoryStore.
+
+    Watches items.xlsx and the stock journal, including the SQLite -wal
+    file where commits land first. When either changes, the new journal
+    entries are applied to the store and announced per barcode, so windows
+    repaint only the rows that changed instead of reloading. Stock checks
+    still read the journal themselves, as a notification can come late
+    or, on network drives, only with the fallback check.
+
+    items_changed(barcodes): stock or price changed in place.
+    rows_changed(): items were added or removed.
+    file_changed(): items.xlsx was replaced and must be read again.
+    """
+
+    items_changed = QtCore.pyqtSignal(list)
+    rows_changed = QtCore.pyqtSignal()
+    file_changed = QtCore.pyqtSignal()
+
+    def __init__(self, store, parent=None):
+        super().__init__(parent)
+        self.store = store
+        journal = journal_path_for(store.path)
+        self.paths = [os.path.abspath(path) for path in (store.path, journal, journal + "-wal")]
+        self.watcher = QtCore.QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self.schedule)
+        # Compaction replaces items.xlsx and SQLite recreates the -wal file;
+        # the folder's notifications let the new files be watched again
+        self.watcher.directoryChanged.connect(self.on_directory_changed)
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(WATCH_DELAY_MS)
+        self.timer.timeout.connect(self.check)
+        self.fallback = QtCore.QTimer(self)
+        self.fallback.setInterval(FALLBACK_POLL_MS)
+        self.fallback.timeout.connect(self.check)
+        self.watch()
+        self.fallback.start()
+
+    def watch(self):
+        watched = set(self.watcher.files()) | set(self.watcher.directories())
+        missing = [path for path in self.paths + [os.path.dirname(self.paths[0])]
+                   if path not in watched and os.path.exists(path)]
+        if missing:
+            self.watcher.addPaths(missing)
+        return bool(missing)
+
+    def on_directory_changed(self, _path):
+        # Other files in the folder (bills, reservations) change all the time; only new watches matter
+        if self.watch():
+            self.schedule()
+
+    def schedule(self, _path=None):
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def check(self):
+        try:
+            self.poll()
+        except Exception:
+            # Retried on the next notification or fallback tick
+            pass
+
+    @metrics.timed("journal sync")
+    def poll(self):
+        self.watch()
+        if not self.store.loaded:
+            return
+        if self.store.needs_reload():
+            self.file_changed.emit()
+            return
+        try:
+            barcodes, layout_changed = self.store.pull_changes()
+        except StaleInventoryError:
+            # Missed entries were compacted into items.xlsx
+            self.file_changed.emit()
+            return
+        if layout_changed:
+            self.rows_changed.emit()
+        elif barcodes:
+            self.items_changed.emit(sorted(barcodes))
+
+    def stop(self):
+        self.timer.stop()
+        self.fallback.stop()
+        paths = self.watcher.files() + self.watcher.directories()
+        if paths:
+            self.watcher.removePaths(paths)
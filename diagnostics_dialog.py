@@ -0,0 +1,117 @@
+import os
+from PyQt5 import QtWidgets, QtCore
+from perf import METRICS_LOG, SamplingProfiler, metrics
+
+REFRESH_MS = 1000
+
+
+class DiagnosticsDialog(QtWidgets.QDialog):
+    """Live timings and file I/O counts for this session (Ctrl+Shift+D).
+
+    The headline shows the spans a cashier feels: scan to display and
+    bill commit. The panel is not modal, so it can stay open while
+    scanning; the profiler keeps running while it is hidden and writes
+    its stacks to cache_dir when stopped.
+    """
+
+    HEADLINE = (("scan to display", "Scan to display"), ("bill commit", "Bill commit"))
+
+    def __init__(self, parent, cache_dir):
+        super().__init__(parent)
+        self.cache_dir = cache_dir
+        self.profiler = None
+        self.setWindowTitle("Diagnostics")
+        self.resize(720, 560)
+        self.timer = QtCore.QTimer(self)
+        self.timer.setInterval(REFRESH_MS)
+        self.timer.timeout.connect(self.refresh)
+        self.init_ui()
+
+    def init_ui(self):
+        layout = QtWidgets.QVBoxLayout(self)
+        self.headline = QtWidgets.QLabel()
+        layout.addWidget(self.headline)
+
+        self.span_table = QtWidgets.QTableWidget(0, 6)
+        self.span_table.setHorizontalHeaderLabels(["Span", "Count", "p50 ms", "p99 ms", "Max ms", "Total ms"])
+        self.span_table.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Stretch)
+        self.span_table.setEditTriggers(QtWidgets.QTableWidget.NoEditTriggers)
+        layout.addWidget(self.span_table)
+
+        self.io_table = QtWidgets.QTableWidget(0, 3)
+        self.io_table.setHorizontalHeaderLabels(["File I/O", "Ops", "KB"])
+        self.io_table.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Stretch)
+        self.io_table.setEditTriggers(QtWidgets.QTableWidget.NoEditTriggers)
+        layout.addWidget(self.io_table)
+
+        self.profile_output = QtWidgets.QPlainTextEdit()
+        self.profile_output.setReadOnly(True)
+        self.profile_output.setPlaceholderText("Start the profiler, do the slow thing, then stop it.")
+        layout.addWidget(self.profile_output)
+
+        btn_layout = QtWidgets.QHBoxLayout()
+        btn_layout.addWidget(QtWidgets.QLabel(f"Log: {os.path.join(self.cache_dir, METRICS_LOG)}"))
+        btn_layout.addStretch()
+        self.profile_btn = QtWidgets.QPushButton("Start Profiler")
+        self.profile_btn.setToolTip("Sample every thread's stack until stopped")
+        self.profile_btn.clicked.connect(self.toggle_profiler)
+        btn_layout.addWidget(self.profile_btn)
+        self.reset_btn = QtWidgets.QPushButton("Reset")
+        self.reset_btn.setToolTip("Start the session statistics over")
+        self.reset_btn.clicked.connect(self.reset)
+        btn_layout.addWidget(self.reset_btn)
+        layout.addLayout(btn_layout)
+
+    def refresh(self):
+        snapshot = metrics.snapshot()
+        spans = snapshot["spans"]
+        parts = []
+        for name, label in self.HEADLINE:
+            stats = spans.get(name)
+            if stats:
+                parts.append(f"{label}: p50 {stats['p50_ms']:.2f} ms, p99 {stats['p99_ms']:.2f} ms ({stats['count']})")
+            else:
+                parts.append(f"{label}: no samples yet")
+        self.headline.setText("    ".join(parts))
+        self._fill(self.span_table, [(name, stats["count"], f"{stats['p50_ms']:.2f}", f"{stats['p99_ms']:.2f}",
+                                      f"{stats['max_ms']:.2f}", f"{stats['total_ms']:.0f}")
+                                     for name, stats in sorted(spans.items())])
+        self._fill(self.io_table, [(name, counter["ops"], f"{counter['bytes'] / 1024:.0f}")
+                                   for name, counter in sorted(snapshot["io"].items())])
+
+    def _fill(self, table, rows):
+        table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for col, value in enumerate(values):
+                table.setItem(row, col, QtWidgets.QTableWidgetItem(str(value)))
+
+    def toggle_profiler(self):
+        if self.profiler is None:
+            self.profiler = SamplingProfiler()
+            self.profiler.start()
+            self.profile_btn.setText("Stop Profiler")
+            self.profile_output.setPlainText("Profiling...")
+            return
+        profiler, self.profiler = self.profiler, None
+        self.profile_btn.setText("Start Profiler")
+        try:
+            path = profiler.save(self.cache_dir)
+        except OSError as e:
+            QtWidgets.QMessageBox.critical(self, "Error", f"Failed to save profile: {e}")
+            return
+        lines = [f"{profiler.samples} samples, stacks saved to {path}", ""]
+        lines += [f"{share:6.1%}  {name}" for name, share in profiler.top_functions()]
+        self.profile_output.setPlainText("\n".join(lines))
+
+    def reset(self):
+        metrics.reset()
+        self.refresh()
+
+    def showEvent(self, event):
+        self.refresh()
+        self.timer.start()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.timer.stop()
+        super().hideEvent(event)
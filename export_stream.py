@@ -0,0 +1,84 @@
+import csv
+import gzip
+import json
+import os
+from perf import file_size, metrics
+
+CHUNK_ROWS = 5000
+EXPORT_FILTERS = "CSV Files (*.csv);;JSON Lines (*.jsonl);;Compressed CSV (*.csv.gz);;Compressed JSON Lines (*.jsonl.gz)"
+
+
+def export_format(path):
+    # ("csv" | "jsonl", compressed) from the file name; anything else is CSV
+    name = path.lower()
+    compressed = name.endswith(".gz")
+    if compressed:
+        name = name[:-3]
+    return ("jsonl" if name.endswith(".jsonl") else "csv"), compressed
+
+
+def _plain(value):
+    # numpy scalars and NaN as plain JSON values
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+def write_rows(path, columns, chunks, total=None, progress=None):
+    """Writes chunks of rows to path as CSV or JSON Lines, optionally gzipped.
+
+    Only one chunk is held at a time. The output is written next to path
+    and renamed at the end, so a failed or cancelled export leaves no
+    half-written file. Returns the number of rows written.
+    """
+    fmt, compressed = export_format(path)
+    tmp_path = path + ".part"
+    done = 0
+    try:
+        if compressed:
+            f = gzip.open(tmp_path, "wt", encoding="utf-8", newline="")
+        else:
+            f = open(tmp_path, "w", encoding="utf-8", newline="")
+        with f:
+            writer = csv.writer(f) if fmt == "csv" else None
+            if writer is not None:
+                writer.writerow(columns)
+            for chunk in chunks:
+                if writer is not None:
+                    writer.writerows(chunk)
+                else:
+                    f.writelines(json.dumps({c: _plain(v) for c, v in zip(columns, row)}, ensure_ascii=False) + "\n"
+                                 for row in chunk)
+                done += len(chunk)
+                if progress is not None:
+                    progress(done, total)
+        os.replace(tmp_path, path)
+        metrics.count("write", "export", file_size(path))
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return done
+
+
+def frame_chunks(df, size=CHUNK_ROWS):
+    for start in range(0, len(df), size):
+        yield df.iloc[start:start + size].to_numpy(dtype=object).tolist()
+
+
+def export_inventory(store, path, progress=None):
+    # The store's frame is already in memory; it is written out a slice at a time
+    store.refresh()
+    df = store.items_df
+    return write_rows(path, list(df.columns), frame_chunks(df), len(df), progress)
+
+
+def export_bill_lines(bill_store, path, progress=None):
+    # One row per bill line, streamed from the database cursor
+    from bill_store import BILL_LINE_COLUMNS
+    return write_rows(path, BILL_LINE_COLUMNS, bill_store.iter_line_chunks(CHUNK_ROWS),
+                      bill_store.line_count(), progress)
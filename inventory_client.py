@@ -0,0 +1,171 @@
+import itertools
+import queue
+import socket
+import threading
+from service_protocol import MAX_LINE, ServiceError, decode, encode
+
+POOL_SIZE = 4
+TIMEOUT = 10
+
+
+class ConnectionPool:
+    """Reusable request/reply connections to the inventory server.
+
+    Each call borrows one connection for a single round trip, so several
+    threads can talk to the server at once without reconnecting per call.
+    """
+
+    def __init__(self, address, size=POOL_SIZE, timeout=TIMEOUT):
+        self.address = address
+        self.timeout = timeout
+        self.idle = queue.LifoQueue(maxsize=size)
+        self.ids = itertools.count(1)
+
+    def _connect(self):
+        sock = socket.create_connection(self.address, timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock, sock.makefile("rb")
+
+    def _round_trip(self, conn, message):
+        sock, reader = conn
+        sock.sendall(encode(message))
+        line = reader.readline(MAX_LINE)
+        if not line:
+            raise ConnectionError("Server closed the connection")
+        return decode(line)
+
+    def call(self, op, **params):
+        message = dict(params, op=op, id=next(self.ids))
+        try:
+            conn = self.idle.get_nowait()
+            reused = True
+        except queue.Empty:
+            conn = self._connect()
+            reused = False
+        try:
+            reply = self._round_trip(conn, message)
+        except (ConnectionError, OSError):
+            self._discard(conn)
+            if not reused:
+                raise
+            # The pooled connection went stale (e.g. server restart): retry once on a new one
+            conn = self._connect()
+            try:
+                reply = self._round_trip(conn, message)
+            except Exception:
+                self._discard(conn)
+                raise
+        try:
+            self.idle.put_nowait(conn)
+        except queue.Full:
+            self._discard(conn)
+        if not reply.get("ok"):
+            raise ServiceError(reply.get("error") or "Request failed")
+        return reply.get("result")
+
+    def _discard(self, conn):
+        sock, reader = conn
+        try:
+            reader.close()
+            sock.close()
+        except OSError:
+            pass
+
+    def close(self):
+        while True:
+            try:
+                self._discard(self.idle.get_nowait())
+            except queue.Empty:
+                break
+
+
+class InventoryClient:
+    """Billing counter side of the inventory server.
+
+    Lookups are answered from a local cache once an item has been fetched.
+    A background thread keeps a subscription open and applies the stock
+    changes the server pushes, so cached items never go stale.
+    """
+
+    def __init__(self, address, on_event=None):
+        self.address = address
+        self.on_event = on_event
+        self.pool = ConnectionPool(address)
+        self.cache = {}
+        # Bumped per pushed event, so a reply that raced an event is not cached
+        self.epoch = 0
+        self.lock = threading.Lock()
+        self.closed = False
+        self.push_socket = None
+        self.listener = threading.Thread(target=self._listen, name="inventory-push", daemon=True)
+        self.listener.start()
+
+    def _listen(self):
+        while not self.closed:
+            try:
+                sock = socket.create_connection(self.address, timeout=TIMEOUT)
+                sock.settimeout(None)
+                self.push_socket = sock
+                reader = sock.makefile("rb")
+                sock.sendall(encode({"id": 0, "op": "subscribe"}))
+                reader.readline(MAX_LINE)
+                # Anything cached before (re)subscribing may have missed an event
+                with self.lock:
+                    self.epoch += 1
+                    self.cache.clear()
+                for line in reader:
+                    self._apply(decode(line))
+            except (OSError, ValueError):
+                pass
+            if not self.closed:
+                threading.Event().wait(1.0)
+
+    def _apply(self, event):
+        with self.lock:
+            self.epoch += 1
+            if event.get("event") == "reload":
+                self.cache.clear()
+            elif event.get("event") == "stock":
+                for barcode, item in event["items"].items():
+                    if barcode in self.cache:
+                        self.cache[barcode] = item
+        if self.on_event is not None:
+            self.on_event(event)
+
+    def lookup(self, barcode):
+        # Quantity is what is left after every counter's reservations
+        with self.lock:
+            if barcode in self.cache:
+                return self.cache[barcode]
+            epoch = self.epoch
+        item = self.pool.call("lookup", barcode=barcode)
+        with self.lock:
+            if epoch == self.epoch:
+                self.cache[barcode] = item
+        return item
+
+    def search(self, query, limit=None):
+        return self.pool.call("search", query=query, limit=limit)
+
+    def reserve(self, cart, barcode, qty):
+        return self.pool.call("reserve", cart=cart, barcode=barcode, qty=qty)
+
+    def release(self, cart, barcode=None):
+        return self.pool.call("release", cart=cart, barcode=barcode)
+
+    def commit(self, cart, lines, include_gst, discount_pct=0):
+        # lines: [(barcode, qty)]; the server prices the bill from its own inventory
+        order = {"items": [{"barcode": barcode, "qty": qty} for barcode, qty in lines], "gst": include_gst,
+                 "discount": discount_pct}
+        return self.pool.call("commit", cart=cart, order=order)
+
+    def close(self):
+        self.closed = True
+        sock = self.push_socket
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+                sock.close()
+            except OSError:
+                pass
+        self.pool.close()
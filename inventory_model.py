@@ -0,0 +1,99 @@
+import numpy as np
+from PyQt5 import QtCore
+from inventory_store import barcode_key
+
+HEADERS = ["Barcode", "Name", "Quantity", "Price"]
+
+
+class InventoryTableModel(QtCore.QAbstractTableModel):
+    """Read-only table model over the inventory's column arrays.
+
+    The view only asks for the cells it paints, so nothing is built per row.
+    Filtering and sorting just replace self.rows, an index array into the
+    columns.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.barcodes = np.array([], dtype=object)
+        self.names = np.array([], dtype=object)
+        self.quantities = np.array([], dtype=np.int64)
+        self.prices = np.array([], dtype=float)
+        self.rows = np.arange(0)
+        self.filter_rows = None
+        self.sort_column = None
+        self.sort_order = QtCore.Qt.AscendingOrder
+
+    def set_frame(self, df):
+        self.beginResetModel()
+        self.barcodes = np.array([barcode_key(b) for b in df["Barcode"]], dtype=object)
+        self.names = df["Name"].astype(str).to_numpy(dtype=object)
+        self.quantities = df["Quantity"].to_numpy()
+        self.prices = df["Price"].to_numpy(dtype=float)
+        self.filter_rows = None
+        self._update_rows()
+        self.endResetModel()
+
+    def update_items(self, df, positions):
+        # Quantity or price changed in place at these frame positions; rows keep their places
+        self.quantities = df["Quantity"].to_numpy()
+        self.prices = df["Price"].to_numpy(dtype=float)
+        if self.sort_column in (2, 3):
+            self.sort(self.sort_column, self.sort_order)
+            return
+        rows = np.flatnonzero(np.isin(self.rows, positions))
+        if len(rows):
+            self.dataChanged.emit(self.index(int(rows[0]), 2), self.index(int(rows[-1]), 3))
+
+    def set_filter(self, positions):
+        # positions: row positions in the frame, or None for every row
+        self.beginResetModel()
+        self.filter_rows = None if positions is None else np.asarray(positions, dtype=np.int64)
+        self._update_rows()
+        self.endResetModel()
+
+    def _update_rows(self):
+        rows = np.arange(len(self.barcodes)) if self.filter_rows is None else self.filter_rows
+        if self.sort_column is not None and len(rows):
+            column = (self.barcodes, self.names, self.quantities, self.prices)[self.sort_column]
+            rows = rows[np.argsort(column[rows], kind="stable")]
+            if self.sort_order == QtCore.Qt.DescendingOrder:
+                rows = rows[::-1]
+        self.rows = rows
+
+    def position(self, row):
+        return int(self.rows[row])
+
+    def barcode(self, row):
+        return self.barcodes[self.rows[row]]
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(HEADERS)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or role != QtCore.Qt.DisplayRole:
+            return None
+        pos = self.rows[index.row()]
+        column = index.column()
+        if column == 0:
+            return self.barcodes[pos]
+        if column == 1:
+            return self.names[pos]
+        if column == 2:
+            return str(self.quantities[pos])
+        return f"₹{self.prices[pos]:.2f}"
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal:
+            return HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def sort(self, column, order=QtCore.Qt.AscendingOrder):
+        self.layoutAboutToBeChanged.emit()
+        self.sort_column = column if column >= 0 else None
+        self.sort_order = order
+        self._update_rows()
+        self.layoutChanged.emit()
@@ -0,0 +1,235 @@
+import argparse
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from billing_engine import BillingError, StockUpdateError
+from reservations import ReservationError, check_quantity
+from service_protocol import (DEFAULT_HOST, DEFAULT_PORT, MAX_LINE, ServiceError, decode, encode,
+                              plain_item)
+
+SYNC_INTERVAL = 1.0
+
+
+class InventoryService:
+    """Owns the inventory and the bill store for every connected counter.
+
+    All store work runs on one worker thread, in arrival order, so the
+    asyncio loop only parses requests and pushes events. Carts hold stock
+    from scan to commit with reserve/release in the shared reservation
+    ledger, which counters using the files directly see as well.
+    """
+
+    def __init__(self, items_path, bills_db):
+        self.items_path = items_path
+        self.bills_db = bills_db
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="store")
+        self.subscribers = set()
+        self.inventory = None
+        self.search = None
+        self.engine = None
+        self.ledger = None
+
+    async def run_store(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    # Everything below up to handle() runs on the store thread
+
+    def open(self):
+        from inventory_store import InventoryStore
+        from bill_store import SQLiteBillStore
+        from billing_engine import BillingEngine
+        from search_index import InventorySearch
+        from reservations import ReservationLedger, ledger_path_for
+        self.ledger = ReservationLedger(ledger_path_for(self.items_path))
+        self.inventory = InventoryStore(self.items_path)
+        self.inventory.load()
+        self.search = InventorySearch(self.inventory)
+        self.search.build()
+        self.engine = BillingEngine(self.inventory, SQLiteBillStore(self.bills_db))
+        return len(self.inventory)
+
+    def sync(self):
+        # Returns the event to push for changes made outside this server, if any
+        if self.inventory.needs_reload():
+            self.inventory.refresh()
+            self.ledger.expire()
+            return {"event": "reload"}
+        changed = set(self.ledger.expire())
+        if self.engine.pending:
+            # Saved bills whose stock change failed; their carts are released once it is in
+            try:
+                self.engine.retry_pending(lambda cart: changed.update(self.release(cart)))
+            except Exception as e:
+                print(f"Stock update still failing: {e}", file=sys.stderr)
+        from inventory_store import StaleInventoryError
+        try:
+            barcodes, _ = self.inventory.pull_changes()
+        except StaleInventoryError:
+            # Another process compacted entries this server had not applied yet
+            self.inventory.refresh()
+            return {"event": "reload"}
+        changed.update(barcodes)
+        return self.stock_event(changed) if changed else None
+
+    def stock_event(self, barcodes):
+        return {"event": "stock", "items": {barcode: self.available_item(barcode) for barcode in barcodes}}
+
+    def available_item(self, barcode, cart=None):
+        # Stock minus what other carts are holding, and the GST slab the bill will charge
+        from pricing import item_rate
+        row = self.inventory.get(barcode)
+        item = plain_item(row)
+        if item is not None:
+            item["Quantity"] = self.ledger.available(self.key(barcode), item["Quantity"], cart)
+            item["GST"] = item_rate(row, self.engine.rates)
+        return item
+
+    def key(self, barcode):
+        from inventory_store import barcode_key
+        return barcode_key(barcode)
+
+    def lookup(self, barcode, cart=None):
+        return self.available_item(barcode, cart)
+
+    def find(self, query, limit=None):
+        df = self.inventory.items_df
+        return [str(df["Barcode"].iat[pos]) for pos in self.search.search(query, limit)]
+
+    def reserve(self, cart, barcode, qty):
+        # Adds qty to the cart's hold on barcode; returns the new hold
+        check_quantity(qty)
+        key = self.key(barcode)
+        # Also reloads items.xlsx if another process compacted entries not applied here
+        self.inventory.refresh()
+        item = self.inventory.get(key)
+        if item is None:
+            raise ServiceError("Item not found!")
+        return self.ledger.reserve(cart, key, qty, item["Quantity"])
+
+    def release(self, cart, barcode=None):
+        # One barcode or the whole cart; returns the barcodes released
+        return self.ledger.release(cart, None if barcode is None else self.key(barcode))
+
+    def commit(self, cart, order):
+        # The cart's own holds count as available; they are released once the bill is saved
+        from billing_engine import stock_deltas
+        self.inventory.refresh()
+        bill = self.engine.prepare(order)
+        for key, delta in stock_deltas([bill]).items():
+            item = self.available_item(key, cart)
+            if item is None or item["Quantity"] + delta < 0:
+                available = item["Quantity"] if item else 0
+                raise ServiceError(f"Not enough stock for {key}! Available: {available}")
+        try:
+            self.engine.commit([bill], key=cart)
+        except StockUpdateError as e:
+            # The bill is saved, so the counter must not bill it again; the cart
+            # keeps its holds until sync() gets the stock change in
+            print(f"{e}; retrying", file=sys.stderr)
+            return bill
+        self.release(cart)
+        return bill
+
+    # Asyncio side
+
+    async def publish(self, event):
+        if event is None or not self.subscribers:
+            return
+        data = encode(event)
+        for writer in list(self.subscribers):
+            try:
+                writer.write(data)
+                await writer.drain()
+            except (ConnectionError, OSError):
+                self.subscribers.discard(writer)
+
+    async def dispatch(self, request):
+        op = request.get("op")
+        cart = request.get("cart")
+        if op == "lookup":
+            return await self.run_store(self.lookup, request["barcode"], cart)
+        if op == "search":
+            return await self.run_store(self.find, request["query"], request.get("limit"))
+        if op == "reserve":
+            result = await self.run_store(self.reserve, cart, request["barcode"], request["qty"])
+            await self.publish(await self.run_store(self.stock_event, [self.key(request["barcode"])]))
+            return result
+        if op == "release":
+            released = await self.run_store(self.release, cart, request.get("barcode"))
+            await self.publish(await self.run_store(self.stock_event, released))
+            return released
+        if op == "commit":
+            bill = await self.run_store(self.commit, cart, request["order"])
+            await self.publish(await self.run_store(self.stock_event, [self.key(item[0]) for item in bill["items"]]))
+            return bill
+        if op == "ping":
+            return "pong"
+        raise ServiceError(f"Unknown op: {op}")
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request = decode(line)
+                if request.get("op") == "subscribe":
+                    # From here on the connection only receives events
+                    self.subscribers.add(writer)
+                    writer.write(encode({"id": request.get("id"), "ok": True, "result": None}))
+                    await writer.drain()
+                    continue
+                try:
+                    reply = {"id": request.get("id"), "ok": True, "result": await self.dispatch(request)}
+                except (ServiceError, ReservationError, BillingError, KeyError, ValueError) as e:
+                    reply = {"id": request.get("id"), "ok": False, "error": str(e)}
+                except Exception as e:
+                    reply = {"id": request.get("id"), "ok": False, "error": f"{type(e).__name__}: {e}"}
+                writer.write(encode(reply))
+                await writer.drain()
+        except (ConnectionError, OSError, ValueError):
+            pass
+        finally:
+            self.subscribers.discard(writer)
+            writer.close()
+
+    async def watch(self):
+        # Picks up edits from Inventory_entry.py and counters not using the server
+        while True:
+            await asyncio.sleep(SYNC_INTERVAL)
+            try:
+                await self.publish(await self.run_store(self.sync))
+            except Exception as e:
+                print(f"Inventory sync failed: {e}", file=sys.stderr)
+
+    async def serve(self, host, port, ready=None):
+        count = await self.run_store(self.open)
+        server = await asyncio.start_server(self.handle, host, port, limit=MAX_LINE)
+        print(f"Serving {count} items on {host}:{server.sockets[0].getsockname()[1]}", file=sys.stderr)
+        if ready is not None:
+            ready(server.sockets[0].getsockname()[1])
+        watcher = asyncio.ensure_future(self.watch())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+            self.executor.shutdown(wait=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve one shared inventory and bill store to several billing counters.")
+    parser.add_argument("--items", default="items.xlsx", help="inventory Excel file")
+    parser.add_argument("--bills-db", default="bills.db", help="bills database")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(InventoryService(args.items, args.bills_db).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,450 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import numpy as np
+import pandas as pd
+from items_cache import file_signature, file_sha1, read_items, write_cache
+from perf import file_size, metrics
+
+COLUMNS = ["Barcode", "Name", "Quantity", "Price"]
+# Read when items.xlsx has them; HSN picks the item's GST slab (see pricing.py)
+OPTIONAL_COLUMNS = ["HSN"]
+COMPACT_EVERY = 500
+# Runs of at least this many upserts/deltas are merged with pandas instead of one by one
+MERGE_MIN_OPS = 64
+
+
+def barcode_key(value):
+    # Barcodes come back from Excel as int, float or str depending on the cell type
+    text = str(value).strip()
+    if text.endswith(".0") and text[:-2].isdigit():
+        text = text[:-2]
+    return text
+
+
+class StaleInventoryError(Exception):
+    """Another counter compacted journal entries this store never applied.
+
+    They are only in the new items.xlsx now, so the store must be loaded
+    again; until then it reports itself as not loaded.
+    """
+
+
+def journal_path_for(path):
+    return os.path.splitext(path)[0] + "_journal.db"
+
+
+def read_inventory_file(path):
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=COLUMNS)
+    df = read_items(path)
+    missing = set(COLUMNS) - set(df.columns)
+    if missing:
+        raise ValueError(f"The file {path} must contain the following columns: {set(COLUMNS)}")
+    return df
+
+
+def read_snapshot(path):
+    # Pure file I/O, safe to run on a background thread
+    return file_signature(path), read_inventory_file(path)
+
+
+class StockJournal:
+    """Append-only log of inventory changes made on top of items.xlsx.
+
+    Every writer appends its ops in one short transaction, so counters never
+    rewrite the spreadsheet themselves. Entries up to base_seq have already
+    been folded into items.xlsx by compaction.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS journal (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            op TEXT NOT NULL,
+            barcode TEXT NOT NULL,
+            name TEXT,
+            quantity INTEGER NOT NULL DEFAULT 0,
+            price REAL
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+
+    def begin(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+
+    def commit(self):
+        self.conn.execute("COMMIT")
+
+    def rollback(self):
+        self.conn.execute("ROLLBACK")
+
+    def _insert(self, ops):
+        self.conn.executemany(
+            "INSERT INTO journal (op, barcode, name, quantity, price) VALUES (?, ?, ?, ?, ?)",
+            [(op, barcode_key(barcode), name, int(quantity), price) for op, barcode, name, quantity, price in ops])
+
+    def append(self, ops):
+        # ops: iterable of (op, barcode, name, quantity, price)
+        self.begin()
+        try:
+            self._insert(ops)
+            self.commit()
+        except Exception:
+            self.rollback()
+            raise
+        metrics.count("write", "journal")
+        return self.last_seq()
+
+    def last_seq(self):
+        return self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM journal").fetchone()[0]
+
+    def entries_after(self, seq, upto=None):
+        if upto is None:
+            return self.conn.execute(
+                "SELECT seq, op, barcode, name, quantity, price FROM journal WHERE seq > ? ORDER BY seq",
+                (seq,)).fetchall()
+        return self.conn.execute(
+            "SELECT seq, op, barcode, name, quantity, price FROM journal WHERE seq > ? AND seq <= ? ORDER BY seq",
+            (seq, upto)).fetchall()
+
+    def base(self):
+        rows = dict(self.conn.execute("SELECT key, value FROM meta").fetchall())
+        return int(rows.get("base_seq", 0)), rows.get("base_signature")
+
+    def set_base(self, seq, signature):
+        self.conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                              [("base_seq", str(seq)), ("base_signature", signature)])
+
+    def prune(self, upto):
+        self.conn.execute("DELETE FROM journal WHERE seq <= ?", (upto,))
+
+    def close(self):
+        self.conn.close()
+
+
+class InventoryStore:
+    """In-memory copy of items.xlsx with an O(1) barcode index.
+
+    The spreadsheet is parsed once and re-read only when its mtime/size
+    changes or after notify_changed(). Stock changes are appended to a
+    StockJournal and applied to the in-memory rows; the journal is folded
+    back into items.xlsx every COMPACT_EVERY entries.
+    """
+
+    def __init__(self, path, journal_path=None):
+        self.path = path
+        self.journal = StockJournal(journal_path or journal_path_for(path))
+        self.items_df = pd.DataFrame(columns=COLUMNS)
+        self.index = {}
+        self.version = 0
+        # Bumped only when rows are added, removed or reloaded (positions change)
+        self.layout_version = 0
+        # Bumped when existing rows move or are renamed (removed or reloaded); rows appended at
+        # the end leave it alone, so indexes over the rows can just be extended
+        self.frame_version = 0
+        self.applied_seq = 0
+        self._signature = None
+        self.loaded = False
+
+    def _file_signature(self):
+        return file_signature(self.path)
+
+    def _read_file(self):
+        return read_inventory_file(self.path)
+
+    def read_snapshot(self):
+        return read_snapshot(self.path)
+
+    def load(self):
+        self.install(*self.read_snapshot())
+
+    def install(self, signature, df):
+        # Must run on the thread that owns the journal connection
+        base_seq, base_signature = self.journal.base()
+        if base_signature is not None and base_signature != signature:
+            # Either a compaction is being written right now or someone edited
+            # the spreadsheet by hand. Waiting for the write lock settles which.
+            self.journal.begin()
+            try:
+                current = self._file_signature()
+                if current != signature:
+                    signature = current
+                    df = self._read_file()
+                base_seq, base_signature = self.journal.base()
+                if base_signature != signature:
+                    # Hand edit: keep the pending journal entries on top of it
+                    self.journal.set_base(base_seq, signature)
+                self.journal.commit()
+            except Exception:
+                self.journal.rollback()
+                raise
+        self._set_frame(df)
+        self._signature = signature
+        self.loaded = True
+        self.applied_seq = base_seq
+        self._apply_entries(self.journal.entries_after(base_seq))
+
+    def _set_frame(self, df):
+        df = df.reset_index(drop=True)
+        df["Barcode"] = df["Barcode"].astype(object)
+        df["Price"] = df["Price"].astype(float)
+        old_df, old_index = self.items_df, self.index
+        self.items_df = df
+        self._rebuild_index()
+        # Another counter's compaction reloads the same rows in the same places
+        if self.index != old_index or not df["Name"].equals(old_df["Name"]):
+            self.frame_version += 1
+
+    def _rebuild_index(self):
+        index = {}
+        for pos, barcode in enumerate(self.items_df["Barcode"]):
+            # Keep the first row for duplicated barcodes, like the old column scan did
+            index.setdefault(barcode_key(barcode), pos)
+        self.index = index
+        self.version += 1
+        self.layout_version += 1
+
+    def _apply_entries(self, entries):
+        entries = list(entries)
+        if not entries:
+            return False
+        run = []
+        for seq, op, barcode, name, quantity, price in entries:
+            if op == "delete":
+                self._apply_run(run)
+                run = []
+                self._apply_op(op, barcode, name, quantity, price)
+            else:
+                run.append((op, barcode, name, quantity, price))
+        self._apply_run(run)
+        self.applied_seq = entries[-1][0]
+        self.version += 1
+        return True
+
+    def _apply_run(self, ops):
+        # ops: upserts and deltas only, so they can be merged per barcode
+        if len(ops) < MERGE_MIN_OPS:
+            for op in ops:
+                self._apply_op(*op)
+            return
+        self._merge_ops(ops)
+
+    def _merge_ops(self, ops):
+        """Applies a run of upserts and deltas in one vectorized pass.
+
+        Gives the same result as _apply_op one entry at a time: quantities
+        add up, the last upsert with a price sets the price, and a barcode
+        not yet in the inventory starts at its first upsert (earlier
+        deltas for it are ignored) with that upsert's name.
+        """
+        ops = pd.DataFrame(ops, columns=["op", "barcode", "name", "quantity", "price"])
+        upsert = ops["op"] == "upsert"
+        known = ops["barcode"].map(self.index.get).notna()
+        order = pd.Series(range(len(ops)), index=ops.index)
+        first_upsert = order.where(upsert).groupby(ops["barcode"]).transform("min")
+        ops = ops[known | (order >= first_upsert)]
+        upsert = upsert[ops.index]
+        by_barcode = ops.groupby("barcode", sort=False)
+        quantity = by_barcode["quantity"].sum()
+        price = ops["price"].where(upsert).groupby(ops["barcode"], sort=False).last()
+        name = ops["name"].where(upsert).groupby(ops["barcode"], sort=False).first()
+
+        df = self.items_df
+        existing = [barcode for barcode in quantity.index if barcode in self.index]
+        if existing:
+            pos = np.array([self.index[barcode] for barcode in existing], dtype=np.int64)
+            qty_col = df.columns.get_loc("Quantity")
+            df.iloc[pos, qty_col] = df["Quantity"].to_numpy()[pos] + quantity[existing].to_numpy()
+            new_price = price.reindex(existing).to_numpy(dtype=float)
+            priced = ~np.isnan(new_price)
+            if priced.any():
+                df.iloc[pos[priced], df.columns.get_loc("Price")] = new_price[priced]
+        added = [barcode for barcode in quantity.index if barcode not in self.index]
+        if added:
+            rows = pd.DataFrame({"Barcode": added, "Name": name[added].to_numpy(), "Quantity": quantity[added].to_numpy(),
+                                 "Price": price[added].to_numpy(dtype=float)}).reindex(columns=df.columns)
+            self._append_rows(rows)
+
+    def _append_rows(self, rows):
+        # Earlier rows keep their positions, so the index is only extended
+        start = len(self.items_df)
+        df = pd.concat([self.items_df, rows], ignore_index=True)
+        df["Barcode"] = df["Barcode"].astype(object)
+        df["Price"] = df["Price"].astype(float)
+        self.items_df = df
+        for pos, barcode in enumerate(df["Barcode"].iloc[start:].tolist(), start):
+            self.index.setdefault(barcode_key(barcode), pos)
+        self.layout_version += 1
+
+    def _apply_op(self, op, barcode, name, quantity, price):
+        df = self.items_df
+        pos = self.index.get(barcode)
+        if op == "delete":
+            if pos is not None:
+                keys = df["Barcode"].map(barcode_key)
+                self.items_df = df[keys != barcode].reset_index(drop=True)
+                self._rebuild_index()
+                self.frame_version += 1
+            return
+        if pos is None:
+            if op != "upsert":
+                return
+            row = {"Barcode": barcode, "Name": name, "Quantity": quantity, "Price": price}
+            df.loc[len(df)] = [row.get(col) for col in df.columns]
+            self.index[barcode] = len(df) - 1
+            self.layout_version += 1
+            return
+        qty_col = df.columns.get_loc("Quantity")
+        df.iat[pos, qty_col] = df.iat[pos, qty_col] + quantity
+        if op == "upsert" and price is not None:
+            df.iat[pos, df.columns.get_loc("Price")] = float(price)
+
+    def needs_reload(self):
+        return not self.loaded or self._file_signature() != self._signature
+
+    def refresh(self, force=False):
+        if force or self.needs_reload():
+            self.load()
+            return True
+        try:
+            return self.refresh_journal()
+        except StaleInventoryError:
+            self.load()
+            return True
+
+    def refresh_journal(self):
+        # Applies only the journal entries written since the last refresh;
+        # raises StaleInventoryError when items.xlsx must be read again
+        if not self.loaded:
+            return False
+        return self._apply_entries(self._new_entries())
+
+    def _new_entries(self):
+        entries = self.journal.entries_after(self.applied_seq)
+        # Read after the entries: a compaction that pruned entries before they
+        # were read has moved the base past applied_seq by then
+        base_seq, _ = self.journal.base()
+        if base_seq > self.applied_seq:
+            self.loaded = False
+            raise StaleInventoryError(f"{os.path.basename(self.path)} was compacted by another counter; "
+                                      "it must be loaded again")
+        return entries
+
+    def pull_changes(self):
+        """Applies journal entries written since the last refresh.
+
+        Returns (barcodes, layout_changed): the barcodes the entries touched
+        and whether rows were added or removed, so a view can repaint just
+        those rows instead of reloading. Raises StaleInventoryError like
+        refresh_journal().
+        """
+        if not self.loaded:
+            return set(), False
+        entries = self._new_entries()
+        layout_version = self.layout_version
+        self._apply_entries(entries)
+        return {barcode for _, _, barcode, _, _, _ in entries}, self.layout_version != layout_version
+
+    def notify_changed(self):
+        self.loaded = False
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, barcode):
+        return barcode_key(barcode) in self.index
+
+    def get(self, barcode):
+        pos = self.index.get(barcode_key(barcode))
+        if pos is None:
+            return None
+        df = self.items_df
+        return {col: df[col].iat[pos] for col in COLUMNS + OPTIONAL_COLUMNS if col in df.columns}
+
+    def _commit(self, ops):
+        self.journal.append(ops)
+        # Pick up our own entries together with anything other counters wrote
+        self.refresh()
+        base_seq, _ = self.journal.base()
+        if self.applied_seq - base_seq >= COMPACT_EVERY:
+            try:
+                self.compact()
+            except Exception:
+                # The entries are safe in the journal; compaction is retried next time
+                pass
+
+    def apply_deltas(self, deltas):
+        # deltas: {barcode: quantity change}, committed as one transaction
+        self._commit([("delta", barcode, None, qty, None) for barcode, qty in deltas.items() if qty])
+
+    def upsert(self, barcode, name, qty, price):
+        self._commit([("upsert", barcode, name, qty, price)])
+
+    def delete(self, barcode):
+        self._commit([("delete", barcode, None, 0, None)])
+
+    def upsert_many(self, rows):
+        # rows: iterable of (barcode, name, qty, price), committed as one journal batch;
+        # a price of None keeps an existing item's price
+        self._commit([("upsert", barcode, name, qty, price) for barcode, name, qty, price in rows])
+
+    def compact(self):
+        """Folds the journal into items.xlsx.
+
+        The workbook is written to a temp file without any lock, from the
+        in-memory rows at the current watermark. The journal write lock is
+        only held to check that nobody compacted or edited the file in the
+        meantime, swap the file in and prune the folded entries, so other
+        counters' appends wait milliseconds rather than for the whole write.
+        Returns False when another counter got there first.
+        """
+        self.refresh()
+        base_seq, _ = self.journal.base()
+        signature = self._signature
+        watermark = self.applied_seq
+        df = self.items_df
+        root, ext = os.path.splitext(self.path)
+        fd, tmp_path = tempfile.mkstemp(suffix=ext, prefix=os.path.basename(root) + ".", dir=os.path.dirname(self.path) or ".")
+        os.close(fd)
+        try:
+            df.to_excel(tmp_path, index=False, engine="openpyxl")
+            if os.path.exists(self.path):
+                # mkstemp makes the file private; keep the permissions items.xlsx had
+                shutil.copymode(self.path, tmp_path)
+            self.journal.begin()
+            try:
+                if self.journal.base()[0] != base_seq or self._file_signature() != signature:
+                    self.journal.rollback()
+                    return False
+                # Renamed under the lock, so no reader pairs the new file with the old base
+                os.replace(tmp_path, self.path)
+                signature = self._file_signature()
+                self.journal.set_base(watermark, signature)
+                self.journal.prune(watermark)
+                self.journal.commit()
+            except Exception:
+                self.journal.rollback()
+                raise
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        metrics.count("write", os.path.basename(self.path), file_size(self.path))
+        # The rows in memory are the new file plus entries after the watermark, already applied
+        self._signature = signature
+        try:
+            # Saves the next startup from parsing the file we just wrote
+            write_cache(self.path, df, signature, file_sha1(self.path))
+        except OSError:
+            pass
+        return True
@@ -0,0 +1,93 @@
+import queue
+import threading
+from PyQt5 import QtCore
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class IOWorker(QtCore.QObject):
+    """Runs file and database jobs on one background thread, in submit order.
+
+    Results and errors come back through the finished/failed signals and are
+    delivered to the job's callbacks on the GUI thread. Because there is a
+    single thread, a job never starts before the previous one has finished,
+    so bill commits are persisted in the order they were made.
+
+    Jobs submitted with on_progress are called with a progress(done, total)
+    keyword argument; calling it after cancel(job_id) raises JobCancelled.
+    """
+
+    finished = QtCore.pyqtSignal(int, object)
+    failed = QtCore.pyqtSignal(int, str)
+    progressed = QtCore.pyqtSignal(int, object, object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._jobs = queue.Queue()
+        self._callbacks = {}
+        self._next_id = 0
+        self._cancelled = set()
+        self.finished.connect(self._on_finished)
+        self.failed.connect(self._on_failed)
+        self.progressed.connect(self._on_progress)
+        self._thread = threading.Thread(target=self._run, name="io-worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args, on_done=None, on_error=None, on_progress=None):
+        self._next_id += 1
+        job_id = self._next_id
+        self._callbacks[job_id] = (on_done, on_error, on_progress)
+        kwargs = {}
+        if on_progress is not None:
+            kwargs["progress"] = lambda done, total: self._report(job_id, done, total)
+        self._jobs.put((job_id, fn, args, kwargs))
+        return job_id
+
+    def cancel(self, job_id):
+        self._cancelled.add(job_id)
+
+    def pending(self):
+        return len(self._callbacks)
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            job_id, fn, args, kwargs = job
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                self.failed.emit(job_id, str(e))
+            else:
+                self.finished.emit(job_id, result)
+
+    def _report(self, job_id, done, total):
+        # Called on the I/O thread from inside a job
+        if job_id in self._cancelled:
+            raise JobCancelled("Cancelled")
+        self.progressed.emit(job_id, done, total)
+
+    def _on_finished(self, job_id, result):
+        on_done, _, _ = self._callbacks.pop(job_id, (None, None, None))
+        self._cancelled.discard(job_id)
+        if on_done is not None:
+            on_done(result)
+
+    def _on_failed(self, job_id, error):
+        _, on_error, _ = self._callbacks.pop(job_id, (None, None, None))
+        self._cancelled.discard(job_id)
+        if on_error is not None:
+            on_error(error)
+
+    def _on_progress(self, job_id, done, total):
+        _, _, on_progress = self._callbacks.get(job_id, (None, None, None))
+        if on_progress is not None:
+            on_progress(done, total)
+
+    def stop(self):
+        # Lets queued jobs (e.g. unsaved bills) finish before returning
+        self._jobs.put(None)
+        self._thread.join()
@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import uuid
+import numpy as np
+import pandas as pd
+from perf import file_size, metrics
+
+CACHE_VERSION = 1
+META_FILE = "meta.json"
+
+
+def cache_dir_for(path):
+    return os.path.splitext(path)[0] + "_cache"
+
+
+def file_signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+
+def file_sha1(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _is_null(value):
+    return value is None or (isinstance(value, float) and value != value)
+
+
+def _encode(series):
+    # Numeric columns are stored as-is; anything else as fixed-width text plus
+    # a one-letter kind per cell so ints, floats and text come back unchanged
+    if series.dtype.kind in "iufb":
+        return "numeric", [series.to_numpy()]
+    values = series.to_numpy(dtype=object)
+    kinds = []
+    text = []
+    for value in values:
+        if _is_null(value):
+            kinds.append("n")
+            text.append("")
+        elif isinstance(value, (bool, np.bool_)):
+            kinds.append("s")
+            text.append(str(value))
+        elif isinstance(value, (int, np.integer)):
+            kinds.append("i")
+            text.append(str(value))
+        elif isinstance(value, (float, np.floating)):
+            kinds.append("f")
+            text.append(repr(float(value)))
+        else:
+            kinds.append("s")
+            text.append(str(value))
+    return "object", [np.array(text, dtype=str), np.array(kinds, dtype="U1")]
+
+
+def _decode(kind, arrays):
+    if kind == "numeric":
+        # Copied out of the mapping: the store updates quantities in place
+        return np.array(arrays[0])
+    text, kinds = arrays
+    if (kinds == "s").all():
+        return text.astype(object)
+    decoders = {"s": str, "i": int, "f": float, "n": lambda _: None}
+    return np.array([decoders[k](t) for t, k in zip(text.tolist(), kinds.tolist())], dtype=object)
+
+
+def write_cache(path, df, signature, sha1):
+    cache_dir = cache_dir_for(path)
+    os.makedirs(cache_dir, exist_ok=True)
+    generation = uuid.uuid4().hex[:8]
+    columns = []
+    for i, col in enumerate(df.columns):
+        kind, arrays = _encode(df[col])
+        files = []
+        for j, array in enumerate(arrays):
+            name = f"{generation}_{i}_{j}.npy"
+            np.save(os.path.join(cache_dir, name), array, allow_pickle=False)
+            files.append(name)
+        columns.append({"name": str(col), "kind": kind, "files": files})
+    metrics.count("write", "items cache", sum(file_size(os.path.join(cache_dir, name))
+                                              for col in columns for name in col["files"]))
+    meta = {"version": CACHE_VERSION, "signature": signature, "sha1": sha1, "rows": len(df), "columns": columns}
+    _write_meta(cache_dir, meta)
+    # Earlier generations; files still mapped by another process are left for next time
+    keep = {name for col in columns for name in col["files"]} | {META_FILE}
+    for name in os.listdir(cache_dir):
+        if name not in keep:
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except OSError:
+                pass
+
+
+def _write_meta(cache_dir, meta):
+    tmp_path = os.path.join(cache_dir, META_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(cache_dir, META_FILE))
+
+
+def read_cache(path):
+    # Returns the cached frame, or None when the cache is missing or stale
+    cache_dir = cache_dir_for(path)
+    try:
+        with open(os.path.join(cache_dir, META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("version") != CACHE_VERSION:
+        return None
+    signature = file_signature(path)
+    if meta["signature"] != signature:
+        # Touched or copied but maybe not edited: the content hash decides
+        if signature is None or file_sha1(path) != meta["sha1"]:
+            return None
+        meta["signature"] = signature
+        try:
+            _write_meta(cache_dir, meta)
+        except OSError:
+            pass
+    mmap_mode = "r" if meta["rows"] else None
+    data = {}
+    nbytes = 0
+    for col in meta["columns"]:
+        arrays = [np.load(os.path.join(cache_dir, name), mmap_mode=mmap_mode, allow_pickle=False)
+                  for name in col["files"]]
+        nbytes += sum(array.nbytes for array in arrays)
+        data[col["name"]] = _decode(col["kind"], arrays)
+    metrics.count("read", "items cache", nbytes)
+    return pd.DataFrame(data, columns=[col["name"] for col in meta["columns"]])
+
+
+def read_items(path):
+    # items.xlsx through the sidecar cache; the cache is rebuilt when the file changes
+    try:
+        df = read_cache(path)
+    except (OSError, ValueError, KeyError):
+        df = None
+    if df is not None:
+        return df
+    signature = file_signature(path)
+    sha1 = file_sha1(path)
+    # object keeps text barcodes such as "0042" from being parsed as numbers
+    df = pd.read_excel(path, dtype={"Barcode": object})
+    metrics.count("read", os.path.basename(path), file_size(path))
+    if file_signature(path) == signature:
+        try:
+            write_cache(path, df, signature, sha1)
+        except OSError:
+            pass
+    return df
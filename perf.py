@@ -0,0 +1,197 @@
+import collections
+import json
+import logging
+import logging.handlers
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+METRICS_LOG = "metrics.jsonl"
+SAMPLES_KEPT = 2000
+# Spans slower than this are logged on their own, not just in the summaries
+SLOW_SPAN_MS = 250
+
+log = logging.getLogger("billing.metrics")
+log.propagate = False
+
+
+class Metrics:
+    """Timing spans and I/O counters for the current session.
+
+    Each span name keeps its last SAMPLES_KEPT durations for percentiles
+    plus running totals. Counters add up operations and bytes, e.g.
+    ("read", "items.xlsx"). Safe to use from the I/O thread.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.samples = collections.defaultdict(lambda: collections.deque(maxlen=SAMPLES_KEPT))
+            self.totals = collections.defaultdict(lambda: [0, 0.0])
+            self.counters = collections.defaultdict(lambda: [0, 0])
+
+    def record(self, name, seconds):
+        with self.lock:
+            self.samples[name].append(seconds)
+            total = self.totals[name]
+            total[0] += 1
+            total[1] += seconds
+        if seconds * 1000 >= SLOW_SPAN_MS and log.handlers:
+            log.info(json.dumps({"at": datetime.now().isoformat(timespec="milliseconds"), "slow": name,
+                                 "ms": round(seconds * 1000, 1)}))
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def timed(self, name):
+        # Decorator form of span()
+        def decorate(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def count(self, kind, target, nbytes=0):
+        with self.lock:
+            counter = self.counters[(kind, target)]
+            counter[0] += 1
+            counter[1] += int(nbytes or 0)
+
+    def snapshot(self):
+        # {"spans": {name: stats}, "io": {"kind target": {"ops", "bytes"}}}
+        with self.lock:
+            samples = {name: sorted(values) for name, values in self.samples.items()}
+            totals = {name: list(total) for name, total in self.totals.items()}
+            counters = {f"{kind} {target}": {"ops": ops, "bytes": nbytes}
+                        for (kind, target), (ops, nbytes) in self.counters.items()}
+        spans = {}
+        for name, ordered in samples.items():
+            count, total = totals[name]
+            spans[name] = {
+                "count": count,
+                "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+                "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+                "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+                "total_ms": round(total * 1000, 1),
+            }
+        return {"spans": spans, "io": counters}
+
+    def log_summary(self, app_name):
+        if not log.handlers:
+            return
+        entry = {"at": datetime.now().isoformat(timespec="seconds"), "app": app_name,
+                 "uptime_s": round(time.time() - self.started)}
+        entry.update(self.snapshot())
+        log.info(json.dumps(entry))
+
+
+def percentile(ordered, q):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def configure_log(cache_dir, max_bytes=1 << 20, backups=5):
+    # metrics.jsonl in cache_dir, rotated at max_bytes; one JSON object per line
+    if log.handlers:
+        return
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(os.path.join(cache_dir, METRICS_LOG), maxBytes=max_bytes,
+                                                       backupCount=backups, encoding="utf-8", delay=True)
+    except OSError:
+        return
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(handler)
+    log.setLevel(logging.INFO)
+
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+class SamplingProfiler:
+    """Samples the Python stacks of the running threads every interval seconds.
+
+    Unlike cProfile it does not slow the profiled code down, so it can be
+    switched on at a busy counter. Each stack starts with its thread's
+    name; stop() returns them as "outer;inner count" lines, the folded
+    format flame graph tools read.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        return [f"{stack} {count}" for stack, count in self.stacks.most_common()]
+
+    def top_functions(self, limit=15):
+        # Innermost functions by the share of samples they were running in
+        leaves = collections.Counter()
+        for stack, count in self.stacks.items():
+            thread, _, frames = stack.partition(";")
+            if frames:
+                leaves[f"{thread} {frames.rsplit(';', 1)[-1].rsplit(':', 1)[0]}"] += count
+        return [(name, count / self.samples) for name, count in leaves.most_common(limit)] if self.samples else []
+
+    def save(self, cache_dir):
+        lines = self.stop()
+        os.makedirs(cache_dir, exist_ok=True)
+        path = os.path.join(cache_dir, f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        return path
+
+
+metrics = Metrics()
@@ -0,0 +1,221 @@
+import argparse
+import csv
+import os
+import sys
+import numpy as np
+
+GST_SLABS = (0, 5, 12, 18, 28)
+DEFAULT_GST = 18
+HSN_RATES_FILE = "hsn_rates.csv"
+# _IS_SLAB[rate] is True for the valid slabs; cheaper than np.isin on every scan
+_IS_SLAB = np.zeros(101, dtype=bool)
+_IS_SLAB[list(GST_SLABS)] = True
+
+
+class PricingError(ValueError):
+    pass
+
+
+def to_paise(values):
+    # Rupees to whole paise, halves rounded up; rounding to 6 places first
+    # absorbs float noise such as 0.285 * 100 == 28.499999999999996
+    return np.floor(np.round(np.asarray(values, dtype=float) * 100, 6) + 0.5).astype(np.int64)
+
+
+def to_rupees(paise):
+    return np.asarray(paise, dtype=np.int64) / 100
+
+
+def to_basis_points(percent):
+    bp = np.floor(np.round(np.asarray(percent, dtype=float) * 100, 6) + 0.5).astype(np.int64)
+    if ((bp < 0) | (bp > 10_000)).any():
+        raise PricingError("Discount must be between 0% and 100%")
+    return bp
+
+
+def check_slabs(rates):
+    rates = np.asarray(rates, dtype=np.int64)
+    if ((rates >= 0) & (rates <= 100)).all() and _IS_SLAB[rates].all():
+        return rates
+    bad = sorted(set(np.unique(rates).tolist()) - set(GST_SLABS))
+    raise PricingError(f"Invalid GST rate(s) {bad}; must be one of {list(GST_SLABS)}")
+
+
+def price_arrays(qty, unit_paise, gst_pct, discount_bp=0, taxed=True):
+    """Line amounts in paise for whole arrays of lines at once.
+
+    Returns (gross, discount, taxable, tax). The discount is taken off
+    each line and GST charged on what is left, both rounded half up per
+    line, so a bill's totals are the plain sums of its lines.
+    """
+    qty = np.asarray(qty, dtype=np.int64)
+    gross = qty * np.asarray(unit_paise, dtype=np.int64)
+    discount = (gross * np.asarray(discount_bp, dtype=np.int64) + 5_000) // 10_000
+    taxable = gross - discount
+    tax = np.where(taxed, (taxable * np.asarray(gst_pct, dtype=np.int64) + 50) // 100, 0)
+    return gross, discount, taxable, tax
+
+
+def group_sums(values, counts):
+    # Sums of consecutive runs of counts[i] values; empty runs sum to 0
+    counts = np.asarray(counts, dtype=np.int64)
+    ends = np.cumsum(counts)
+    running = np.concatenate(([0], np.cumsum(values, dtype=np.int64)))
+    return running[ends] - running[ends - counts]
+
+
+def price_bills(bills, include_gst, discount_pct=0):
+    """Prices any number of bills in one vectorized pass.
+
+    bills: list of line lists, each line (barcode, name, qty, unit_price)
+    with an optional fifth GST rate in percent (DEFAULT_GST otherwise).
+    include_gst and discount_pct are one value for every bill or one per
+    bill. Returns [(items, subtotal, gst, grand_total)] in rupees, items
+    being [barcode, name, qty, unit_price, total] with total after the
+    discount and before GST.
+    """
+    counts = np.array([len(lines) for lines in bills], dtype=np.int64)
+    flat = [line for lines in bills for line in lines]
+    qty = np.array([line[2] for line in flat], dtype=np.int64)
+    unit = to_paise([line[3] for line in flat])
+    rates = check_slabs([line[4] if len(line) > 4 else DEFAULT_GST for line in flat])
+    # Per-bill flags and discounts are spread over their lines; single values broadcast as they are
+    taxed = np.asarray(include_gst, dtype=bool)
+    discount = to_basis_points(discount_pct)
+    if taxed.ndim:
+        taxed = np.repeat(taxed, counts)
+    if discount.ndim:
+        discount = np.repeat(discount, counts)
+    _, _, taxable, tax = price_arrays(qty, unit, rates, discount, taxed)
+    subtotals = group_sums(taxable, counts)
+    taxes = group_sums(tax, counts)
+    line_totals = to_rupees(taxable).tolist()
+    unit_prices = to_rupees(unit).tolist()
+    priced = []
+    start = 0
+    for count, subtotal, gst in zip(counts.tolist(), subtotals.tolist(), taxes.tolist()):
+        items = [[line[0], line[1], int(line[2]), unit_prices[i], line_totals[i]]
+                 for i, line in enumerate(flat[start:start + count], start)]
+        priced.append((items, subtotal / 100, gst / 100, (subtotal + gst) / 100))
+        start += count
+    return priced
+
+
+def hsn_key(value):
+    # HSN codes have an even number of digits; Excel drops the leading 0 of chapters 01-09
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    text = str(value).strip()
+    if text.endswith(".0") and text[:-2].isdigit():
+        text = text[:-2]
+    if text.isdigit() and len(text) % 2:
+        text = "0" + text
+    return text
+
+
+def hsn_rates_path_for(items_path):
+    return os.path.join(os.path.dirname(items_path), HSN_RATES_FILE)
+
+
+class GstRates:
+    """GST slab per HSN code; the longest matching prefix wins.
+
+    The table comes from hsn_rates.csv (columns HSN, Rate) next to
+    items.xlsx, so a chapter ("04") and a more specific heading ("0402")
+    can have different slabs. Items without an HSN code, or with one the
+    table does not know, are charged the default rate.
+    """
+
+    def __init__(self, table=None, default=DEFAULT_GST):
+        self.default = int(check_slabs([default])[0])
+        self.table = {}
+        for hsn, rate in (table or {}).items():
+            self.table[hsn_key(hsn)] = int(check_slabs([rate])[0])
+
+    @classmethod
+    def from_file(cls, path, default=DEFAULT_GST):
+        if not os.path.exists(path):
+            return cls(default=default)
+        with open(path, newline="", encoding="utf-8") as f:
+            table = {row["HSN"]: int(float(row["Rate"])) for row in csv.DictReader(f) if row.get("HSN")}
+        return cls(table, default)
+
+    @classmethod
+    def for_items(cls, items_path):
+        return cls.from_file(hsn_rates_path_for(items_path))
+
+    def rate(self, hsn):
+        code = hsn_key(hsn)
+        for end in range(len(code), 0, -1):
+            rate = self.table.get(code[:end])
+            if rate is not None:
+                return rate
+        return self.default
+
+    def rates(self, hsn_values):
+        # Vectorized over a column: each distinct code is looked up once
+        codes, inverse = np.unique(np.array([hsn_key(value) for value in hsn_values], dtype=str),
+                                   return_inverse=True)
+        return np.array([self.rate(code) for code in codes], dtype=np.int64)[inverse]
+
+
+def item_rate(item, rates):
+    # GST percent for an InventoryStore.get() row, which has "HSN" only if items.xlsx does
+    return rates.rate(item.get("HSN")) if rates is not None else DEFAULT_GST
+
+
+def check_bills(bill_store, chunk=50_000):
+    """End-of-day reconciliation of stored bills, to the paisa.
+
+    Returns [(bill_id, problem)] for bills whose line totals do not add
+    up to their subtotal, or whose grand total is not subtotal plus GST.
+    Lines are checked in chunks with NumPy, not bill by bill.
+    """
+    problems = []
+    cursor = bill_store.conn.execute(
+        "SELECT b.bill_id, b.subtotal, b.gst, b.grand_total, COALESCE(SUM(i.total), 0)"
+        " FROM bills b LEFT JOIN bill_items i ON i.bill_id = b.bill_id GROUP BY b.bill_id ORDER BY b.rowid")
+    while True:
+        rows = cursor.fetchmany(chunk)
+        if not rows:
+            break
+        ids = [row[0] for row in rows]
+        subtotal, gst, grand_total, lines = (to_paise([row[i] for row in rows]) for i in range(1, 5))
+        for pos in np.flatnonzero(lines != subtotal).tolist():
+            problems.append((ids[pos], f"lines add up to {lines[pos] / 100:.2f}, subtotal is {subtotal[pos] / 100:.2f}"))
+        for pos in np.flatnonzero(subtotal + gst != grand_total).tolist():
+            problems.append((ids[pos], f"subtotal + GST is {(subtotal[pos] + gst[pos]) / 100:.2f}, "
+                                       f"grand total is {grand_total[pos] / 100:.2f}"))
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check stored bills and look up GST rates.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    check = commands.add_parser("check", help="reconcile every bill's totals to the paisa")
+    check.add_argument("--bills-db", default="bills.db", help="bills database")
+    rate = commands.add_parser("rate", help="GST rate of HSN codes")
+    rate.add_argument("hsn", nargs="+")
+    rate.add_argument("--items", default="items.xlsx", help="inventory file; hsn_rates.csv is read next to it")
+    args = parser.parse_args(argv)
+
+    if args.command == "rate":
+        rates = GstRates.for_items(args.items)
+        for code in args.hsn:
+            print(f"{hsn_key(code)}: {rates.rate(code)}%")
+        return 0
+    from bill_store import SQLiteBillStore
+    store = SQLiteBillStore(args.bills_db)
+    try:
+        problems = check_bills(store)
+        count = store.bill_count()
+    finally:
+        store.close()
+    for bill_id, problem in problems:
+        print(f"{bill_id}: {problem}")
+    print(f"Checked {count} bills, {len(problems)} problems")
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
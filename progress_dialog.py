@@ -0,0 +1,39 @@
+from PyQt5 import QtWidgets, QtCore
+
+
+def run_with_progress(parent, io, label, fn, *args, on_done=None, on_error=None):
+    """Runs fn on the I/O worker behind a modal progress dialog.
+
+    fn must accept a progress(done, total) keyword argument; total may be
+    None when the size is not known up front. Cancel stops the job at its
+    next progress call and on_error is not called for it.
+    """
+    dialog = QtWidgets.QProgressDialog(label, "Cancel", 0, 100, parent)
+    dialog.setWindowTitle("Please wait")
+    dialog.setWindowModality(QtCore.Qt.WindowModal)
+    dialog.setMinimumDuration(300)
+    dialog.setAutoClose(False)
+    dialog.setAutoReset(False)
+    dialog.setValue(0)
+
+    def on_progress(done, total):
+        if total:
+            dialog.setMaximum(100)
+            dialog.setValue(min(100, int(done * 100 / total)))
+        else:
+            dialog.setMaximum(0)
+
+    def finish(result):
+        dialog.close()
+        if on_done is not None:
+            on_done(result)
+
+    def fail(error):
+        cancelled = dialog.wasCanceled()
+        dialog.close()
+        if not cancelled and on_error is not None:
+            on_error(error)
+
+    job_id = io.submit(fn, *args, on_done=finish, on_error=fail, on_progress=on_progress)
+    dialog.canceled.connect(lambda: io.cancel(job_id))
+    return job_id
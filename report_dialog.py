@@ -0,0 +1,96 @@
+from PyQt5 import QtWidgets, QtCore
+
+
+class SalesReportDialog(QtWidgets.QDialog):
+    """Sales totals, revenue per day and top sellers for a date range.
+
+    Queries run as jobs on the owning window's I/O worker; history() is
+    called on that thread and returns its BillHistory connection.
+    """
+
+    def __init__(self, parent, io, history, legacy_path=None):
+        super().__init__(parent)
+        self.io = io
+        self.history = history
+        self.legacy_path = legacy_path
+        self.setWindowTitle("Sales Report")
+        self.resize(700, 500)
+        self.init_ui()
+        self.run_report()
+
+    def init_ui(self):
+        layout = QtWidgets.QVBoxLayout(self)
+
+        filter_layout = QtWidgets.QHBoxLayout()
+        today = QtCore.QDate.currentDate()
+        self.from_input = QtWidgets.QDateEdit(today.addDays(-30))
+        self.from_input.setCalendarPopup(True)
+        self.from_input.setDisplayFormat("yyyy-MM-dd")
+        self.to_input = QtWidgets.QDateEdit(today)
+        self.to_input.setCalendarPopup(True)
+        self.to_input.setDisplayFormat("yyyy-MM-dd")
+        self.barcode_input = QtWidgets.QLineEdit()
+        self.barcode_input.setPlaceholderText("Barcode (optional)")
+        self.barcode_input.setToolTip("Show sales of one item")
+        self.barcode_input.returnPressed.connect(self.run_report)
+        self.run_btn = QtWidgets.QPushButton("Show")
+        self.run_btn.clicked.connect(self.run_report)
+        filter_layout.addWidget(QtWidgets.QLabel("From:"))
+        filter_layout.addWidget(self.from_input)
+        filter_layout.addWidget(QtWidgets.QLabel("To:"))
+        filter_layout.addWidget(self.to_input)
+        filter_layout.addWidget(self.barcode_input)
+        filter_layout.addWidget(self.run_btn)
+        layout.addLayout(filter_layout)
+
+        self.totals_label = QtWidgets.QLabel("Loading...")
+        layout.addWidget(self.totals_label)
+        self.item_label = QtWidgets.QLabel()
+        layout.addWidget(self.item_label)
+
+        tabs = QtWidgets.QTabWidget()
+        self.daily_table = self.make_table(["Date", "Bills", "Subtotal", "GST", "Grand Total"])
+        self.top_table = self.make_table(["Barcode", "Name", "Qty", "Revenue"])
+        tabs.addTab(self.daily_table, "Per Day")
+        tabs.addTab(self.top_table, "Top Sellers")
+        layout.addWidget(tabs)
+
+    def make_table(self, headers):
+        table = QtWidgets.QTableWidget(0, len(headers))
+        table.setHorizontalHeaderLabels(headers)
+        table.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Stretch)
+        table.setEditTriggers(QtWidgets.QTableWidget.NoEditTriggers)
+        return table
+
+    def run_report(self):
+        from bill_history import sales_report
+        start = self.from_input.date().toString("yyyy-MM-dd")
+        end = self.to_input.date().toString("yyyy-MM-dd")
+        barcode = self.barcode_input.text().strip() or None
+        self.run_btn.setEnabled(False)
+        self.io.submit(lambda: sales_report(self.history(), self.legacy_path, start, end, barcode),
+                       on_done=self.show_report, on_error=self.on_report_error)
+
+    def show_report(self, report):
+        self.run_btn.setEnabled(True)
+        t = report["totals"]
+        self.totals_label.setText(f"Bills: {t['bills']}   Subtotal: ₹{t['subtotal']:.2f}   "
+                                  f"GST: ₹{t['gst']:.2f}   Grand Total: ₹{t['grand_total']:.2f}")
+        item = report["item"]
+        self.item_label.setText("" if item is None else
+                                f"{item['barcode']}: {item['qty']} sold in {item['bills']} bills, ₹{item['revenue']:.2f}")
+        self.fill_table(self.daily_table, [(date, bills, f"₹{subtotal:.2f}", f"₹{gst:.2f}", f"₹{grand_total:.2f}")
+                                           for date, bills, subtotal, gst, grand_total in report["per_day"]])
+        self.fill_table(self.top_table, [(barcode, name, qty, f"₹{revenue:.2f}")
+                                         for barcode, name, qty, revenue in report["top"]])
+
+    def fill_table(self, table, rows):
+        table.setRowCount(len(rows))
+        for r, row in enumerate(rows):
+            for c, value in enumerate(row):
+                table.setItem(r, c, QtWidgets.QTableWidgetItem(str(value)))
+
+    def on_report_error(self, error):
+        self.run_btn.setEnabled(True)
+        self.totals_label.setText("Report not available")
+        QtWidgets.QMessageBox.critical(self, "Error", f"Failed to load sales report: {error}")
@@ -0,0 +1,168 @@
+import numbers
+import os
+import sqlite3
+import time
+
+RESERVATION_TTL = 15 * 60
+
+
+class ReservationError(Exception):
+    pass
+
+
+def ledger_path_for(path):
+    return os.path.splitext(path)[0] + "_reservations.db"
+
+
+def check_quantity(qty):
+    # A zero or negative hold would lower the held total and let other carts take more than is in stock
+    if isinstance(qty, bool) or not isinstance(qty, numbers.Integral) or qty <= 0:
+        raise ReservationError(f"Invalid quantity {qty!r}; must be a whole number above 0")
+    return int(qty)
+
+
+class ReservationLedger:
+    """Stock held by open carts, shared by every process through SQLite.
+
+    A hold is keyed by (cart, barcode) and lasts until the cart is billed
+    or abandoned, or until the cart has not been touched for ttl seconds.
+    The expiry is kept once per cart, so a scan refreshes one row however
+    long the cart is. The held table keeps a running total per barcode, so
+    "how much can this cart still take" is two primary-key reads instead
+    of a sum over carts.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS holds (
+            cart TEXT NOT NULL,
+            barcode TEXT NOT NULL,
+            qty INTEGER NOT NULL,
+            PRIMARY KEY (cart, barcode)
+        );
+        CREATE TABLE IF NOT EXISTS carts (
+            cart TEXT PRIMARY KEY,
+            expires REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS carts_by_expiry ON carts(expires);
+        CREATE TABLE IF NOT EXISTS held (
+            barcode TEXT PRIMARY KEY,
+            qty INTEGER NOT NULL
+        );
+    """
+
+    def __init__(self, path, ttl=RESERVATION_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+
+    def _transaction(self, fn, *args):
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(*args)
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def _hold(self, cart, barcode):
+        row = self.conn.execute("SELECT qty FROM holds WHERE cart = ? AND barcode = ?", (cart, barcode)).fetchone()
+        return row[0] if row else 0
+
+    def _total(self, barcode):
+        row = self.conn.execute("SELECT qty FROM held WHERE barcode = ?", (barcode,)).fetchone()
+        return row[0] if row else 0
+
+    def _drop(self, rows):
+        # rows: [(cart, barcode, qty)] to remove, keeping the totals in step
+        self.conn.executemany("DELETE FROM holds WHERE cart = ? AND barcode = ?",
+                              [(cart, barcode) for cart, barcode, _ in rows])
+        self.conn.executemany("UPDATE held SET qty = qty - ? WHERE barcode = ?",
+                              [(qty, barcode) for _, barcode, qty in rows])
+        self.conn.execute("DELETE FROM held WHERE qty <= 0")
+        return sorted({barcode for _, barcode, _ in rows})
+
+    def _expire(self, now):
+        # Uses the expiry index, so it costs nothing while no cart is stale
+        stale = self.conn.execute(
+            "SELECT h.cart, h.barcode, h.qty FROM carts c JOIN holds h ON h.cart = c.cart WHERE c.expires < ?",
+            (now,)).fetchall()
+        self.conn.execute("DELETE FROM carts WHERE expires < ?", (now,))
+        return self._drop(stale) if stale else []
+
+    def held_by_others(self, cart, barcode):
+        return self._total(barcode) - self._hold(cart, barcode)
+
+    def available(self, barcode, stock, cart=None):
+        # Units of barcode that cart may still add, given stock on hand
+        return int(stock) - self.held_by_others(cart, barcode)
+
+    def reserve(self, cart, barcode, qty, stock):
+        """Adds qty to cart's hold on barcode; returns the cart's new hold.
+
+        Raises ReservationError when stock minus every other cart's hold
+        cannot cover the cart's total. Reserving also keeps the cart's
+        other holds from expiring.
+        """
+        return self._transaction(self._reserve, cart, barcode, qty, int(stock))
+
+    def _reserve(self, cart, barcode, qty, stock):
+        qty = check_quantity(qty)
+        now = time.time()
+        self._expire(now)
+        mine = self._hold(cart, barcode)
+        others = self._total(barcode) - mine
+        if mine + qty > stock - others:
+            raise ReservationError(f"Not enough stock! Available: {max(stock - others - mine, 0)}")
+        self.conn.execute(
+            "INSERT INTO holds VALUES (?, ?, ?) ON CONFLICT(cart, barcode) DO UPDATE SET qty = qty + excluded.qty",
+            (cart, barcode, qty))
+        self.conn.execute(
+            "INSERT INTO held VALUES (?, ?) ON CONFLICT(barcode) DO UPDATE SET qty = qty + excluded.qty",
+            (barcode, qty))
+        # Keeps every hold of the cart alive with a single row
+        self.conn.execute(
+            "INSERT INTO carts VALUES (?, ?) ON CONFLICT(cart) DO UPDATE SET expires = excluded.expires",
+            (cart, now + self.ttl))
+        return mine + qty
+
+    def confirm(self, cart, wanted):
+        """Makes sure cart holds what it is about to be billed for.
+
+        wanted: [(barcode, qty, stock)]. Holds that expired while the cart
+        sat idle are taken again if the stock still allows it; otherwise
+        ReservationError is raised and nothing is taken.
+        """
+        return self._transaction(self._confirm, cart, wanted)
+
+    def _confirm(self, cart, wanted):
+        for barcode, qty, stock in wanted:
+            missing = qty - self._hold(cart, barcode)
+            if missing > 0:
+                try:
+                    self._reserve(cart, barcode, missing, int(stock))
+                except ReservationError as e:
+                    raise ReservationError(f"{barcode}: {e}") from None
+
+    def release(self, cart, barcode=None):
+        # One line or the whole cart; returns the barcodes whose holds changed
+        return self._transaction(self._release, cart, barcode)
+
+    def _release(self, cart, barcode):
+        if barcode is None:
+            rows = self.conn.execute("SELECT cart, barcode, qty FROM holds WHERE cart = ?", (cart,)).fetchall()
+            self.conn.execute("DELETE FROM carts WHERE cart = ?", (cart,))
+        else:
+            rows = self.conn.execute("SELECT cart, barcode, qty FROM holds WHERE cart = ? AND barcode = ?",
+                                     (cart, barcode)).fetchall()
+        return self._drop(rows)
+
+    def expire(self):
+        # Returns the barcodes whose stale holds were dropped
+        return self._transaction(self._expire, time.time())
+
+    def close(self):
+        self.conn.close()
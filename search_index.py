@@ -0,0 +1,113 @@
+from array import array
+from inventory_store import barcode_key
+
+GRAM = 3
+
+
+class SearchIndex:
+    """Trigram index over lowercased barcode and name of every inventory row.
+
+    Positions returned by search() are row positions in the store's items_df,
+    in row order. When the new query extends the previous one, only the
+    previous hits are re-checked. Rows appended at the end are added with
+    extend(), which keeps every posting list in row order.
+    """
+
+    def __init__(self, barcodes, names, layout_version=None, frame_version=None):
+        self.texts = []
+        self.postings = {}
+        self.frame_version = frame_version
+        self.extend(barcodes, names, layout_version)
+
+    def extend(self, barcodes, names, layout_version=None):
+        start = len(self.texts)
+        # \x00 keeps a match from spanning the barcode and the name
+        self.texts.extend(f"{barcode_key(b).lower()}\x00{str(n).lower()}" for b, n in zip(barcodes, names))
+        for pos in range(start, len(self.texts)):
+            text = self.texts[pos]
+            for gram in {text[i:i + GRAM] for i in range(len(text) - GRAM + 1)}:
+                if "\x00" not in gram:
+                    posting = self.postings.get(gram)
+                    if posting is None:
+                        # Arrays rather than lists: the garbage collector never walks them
+                        posting = self.postings[gram] = array("i")
+                    posting.append(pos)
+        self.layout_version = layout_version
+        # New rows may match the last query too
+        self._last_query = None
+        self._last_hits = None
+
+    def _candidates(self, query):
+        if self._last_query and self._last_query in query:
+            return self._last_hits
+        if len(query) < GRAM:
+            return range(len(self.texts))
+        grams = {query[i:i + GRAM] for i in range(len(query) - GRAM + 1)}
+        best = None
+        for gram in grams:
+            posting = self.postings.get(gram)
+            if posting is None:
+                return []
+            if best is None or len(posting) < len(best):
+                best = posting
+        return best
+
+    def search(self, query, limit=None):
+        query = query.strip().lower()
+        if not query:
+            self._last_query = None
+            self._last_hits = None
+            hits = range(len(self.texts))
+        else:
+            texts = self.texts
+            hits = [pos for pos in self._candidates(query) if query in texts[pos]]
+            self._last_query = query
+            self._last_hits = hits
+        if limit is not None:
+            hits = hits[:limit]
+        return list(hits)
+
+
+class InventorySearch:
+    """Keeps a SearchIndex in step with an InventoryStore.
+
+    Rows appended since the last search (new items from any counter) are
+    indexed on their own. A full build is needed only when rows are removed
+    or the inventory is reloaded, and at 100k rows it takes longer than a
+    keystroke may. The windows therefore build it on the I/O thread from
+    source() and hand it over with adopt(); until then ready() is False.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.index = None
+
+    def ready(self):
+        return self.index is not None and self.index.frame_version == self.store.frame_version
+
+    def source(self):
+        # Arguments for SearchIndex, taken on the thread that owns the store
+        store = self.store
+        df = store.items_df
+        return df["Barcode"].tolist(), df["Name"].tolist(), store.layout_version, store.frame_version
+
+    def adopt(self, index):
+        # False when rows moved while the index was being built
+        if index.frame_version != self.store.frame_version:
+            return False
+        self.index = index
+        return True
+
+    def build(self):
+        self.index = SearchIndex(*self.source())
+
+    def search(self, query, limit=None):
+        store = self.store
+        if not self.ready():
+            self.build()
+        elif self.index.layout_version != store.layout_version:
+            df = store.items_df
+            start = len(self.index.texts)
+            self.index.extend(df["Barcode"].iloc[start:].tolist(), df["Name"].iloc[start:].tolist(),
+                              store.layout_version)
+        return self.index.search(query, limit)
@@ -0,0 +1,41 @@
+import json
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Largest single message (one line of JSON)
+MAX_LINE = 1 << 20
+
+# Requests are one JSON object per line: {"id": n, "op": "...", ...params}.
+# Replies echo the id: {"id": n, "ok": true, "result": ...} or
+# {"id": n, "ok": false, "error": "..."}. After a "subscribe" request the
+# connection only carries pushed events: {"event": "stock", "items":
+# {barcode: item or null}} and {"event": "reload"}.
+
+
+class ServiceError(Exception):
+    pass
+
+
+def encode(message):
+    return (json.dumps(message, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def decode(line):
+    return json.loads(line.decode("utf-8"))
+
+
+def plain_item(item):
+    # InventoryStore.get() rows hold numpy scalars; the wire wants plain JSON
+    if item is None:
+        return None
+    return {
+        "Barcode": str(item["Barcode"]),
+        "Name": str(item["Name"]),
+        "Quantity": int(item["Quantity"]),
+        "Price": float(item["Price"]),
+    }
+
+
+def parse_address(text):
+    host, _, port = (text or "").rpartition(":")
+    return host or DEFAULT_HOST, int(port or DEFAULT_PORT)
@@ -0,0 +1,115 @@
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from importlib import import_module, metadata
+from PyQt5 import QtCore, QtGui
+
+LAUNCH_LOG = "launch_times.jsonl"
+
+
+class LaunchTimer:
+    """Records named checkpoints from process start to the first usable scan."""
+
+    def __init__(self, app_name, start=None):
+        self.app_name = app_name
+        self.start = start if start is not None else time.perf_counter()
+        self.marks = []
+        self.reported = False
+
+    def mark(self, label):
+        self.marks.append((label, time.perf_counter()))
+
+    def breakdown(self):
+        rows = []
+        previous = self.start
+        for label, at in self.marks:
+            rows.append((label, (at - previous) * 1000, (at - self.start) * 1000))
+            previous = at
+        return rows
+
+    def report(self, cache_dir=None):
+        # Once per launch: a table on stderr plus one JSON line per launch in cache_dir
+        if self.reported:
+            return
+        self.reported = True
+        rows = self.breakdown()
+        print(f"{self.app_name} launch breakdown:", file=sys.stderr)
+        for label, step, total in rows:
+            print(f"  {label:<24} +{step:8.1f} ms  {total:8.1f} ms", file=sys.stderr)
+        if cache_dir is None:
+            return
+        entry = {
+            "app": self.app_name,
+            "at": datetime.now().isoformat(timespec="seconds"),
+            "total_ms": round(rows[-1][2], 1) if rows else 0.0,
+            "steps": {label: round(step, 1) for label, step, _ in rows},
+        }
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(os.path.join(cache_dir, LAUNCH_LOG), "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+        except OSError:
+            pass
+
+
+def load_dark_stylesheet(cache_dir):
+    # Returns the qdarkstyle sheet, or None when qdarkstyle is not installed.
+    # The generated sheet is cached per qdarkstyle/Qt version, so later
+    # launches only register the icon resources instead of rebuilding it.
+    try:
+        version = metadata.version("qdarkstyle")
+    except metadata.PackageNotFoundError:
+        return None
+    cache_path = os.path.join(cache_dir, f"qdarkstyle-{version}-qt{QtCore.QT_VERSION_STR}.qss")
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            stylesheet = f.read()
+    except OSError:
+        stylesheet = None
+    if stylesheet is not None:
+        # The icons used by the sheet; the module moved between qdarkstyle 2.8, 3.0 and 3.1
+        for module in ("qdarkstyle.dark.darkstyle_rc", "qdarkstyle.dark.style_rc", "qdarkstyle.style_rc"):
+            try:
+                import_module(module)
+                return stylesheet
+            except ImportError:
+                pass
+        # Unknown layout: let qdarkstyle build the sheet and register its icons itself
+    try:
+        import qdarkstyle
+        stylesheet = qdarkstyle.load_stylesheet_pyqt5()
+    except ImportError:
+        return None
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(cache_path, "w", encoding="utf-8") as f:
+            f.write(stylesheet)
+    except OSError:
+        pass
+    return stylesheet
+
+
+def cached_logo_pixmap(image_path, cache_dir, width, height):
+    # The full-size logo is decoded and rescaled once; later launches load the small PNG
+    try:
+        st = os.stat(image_path)
+        key = f"{st.st_mtime_ns}_{st.st_size}"
+    except OSError:
+        return QtGui.QPixmap()
+    cache_path = os.path.join(cache_dir, f"logo_{width}x{height}_{key}.png")
+    if os.path.exists(cache_path):
+        pixmap = QtGui.QPixmap(cache_path)
+        if not pixmap.isNull():
+            return pixmap
+    pixmap = QtGui.QPixmap(image_path)
+    if pixmap.isNull():
+        return pixmap
+    pixmap = pixmap.scaled(width, height, QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        pixmap.save(cache_path, "PNG")
+    except OSError:
+        pass
+    return pixmap
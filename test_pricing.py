@@ -0,0 +1,110 @@
+import random
+import unittest
+from decimal import ROUND_HALF_UP, Decimal
+from cart import Cart
+from pricing import GST_SLABS, PricingError, price_arrays, price_bills, to_basis_points, to_paise
+
+
+def reference_totals(lines, include_gst, discount_pct):
+    # The same rules in Decimal, one line at a time: unit price rounded to
+    # the paisa and the discount to a basis point, discount off each line,
+    # GST on what is left, halves up
+    paisa = Decimal("0.01")
+    discount_pct = Decimal(str(discount_pct)).quantize(paisa, ROUND_HALF_UP)
+    subtotal = Decimal(0)
+    gst = Decimal(0)
+    for _, _, qty, price, rate in lines:
+        gross = Decimal(str(price)).quantize(paisa, ROUND_HALF_UP) * qty
+        taxable = gross - (gross * discount_pct / 100).quantize(paisa, ROUND_HALF_UP)
+        subtotal += taxable
+        if include_gst:
+            gst += (taxable * rate / 100).quantize(paisa, ROUND_HALF_UP)
+    return float(subtotal), float(gst), float(subtotal + gst)
+
+
+class RoundingTest(unittest.TestCase):
+    def test_to_paise_rounds_halves_up(self):
+        # 0.285 * 100 and 1.005 * 100 land just below the half in binary floating point
+        self.assertEqual(to_paise([0.005, 0.015, 0.285, 1.005, 2.675, 10.0]).tolist(), [1, 2, 29, 101, 268, 1000])
+
+    def test_to_basis_points_rounds_halves_up(self):
+        self.assertEqual(to_basis_points([0.005, 2.5, 12.345, 33.33, 100]).tolist(), [1, 250, 1235, 3333, 10_000])
+
+    def test_to_basis_points_rejects_out_of_range(self):
+        for percent in (-0.01, 100.01):
+            with self.assertRaises(PricingError):
+                to_basis_points(percent)
+
+    def test_discount_rounds_half_paisa_up(self):
+        # 50% of 1 and 3 paise is 0.5 and 1.5 paise
+        _, discount, taxable, _ = price_arrays([1, 1], [1, 3], [0, 0], 5_000)
+        self.assertEqual(discount.tolist(), [1, 2])
+        self.assertEqual(taxable.tolist(), [0, 1])
+
+    def test_gst_rounds_half_paisa_up(self):
+        # 5% of 10 and 30 paise is 0.5 and 1.5 paise; untaxed lines get none
+        _, _, _, tax = price_arrays([1, 1], [10, 30], [5, 5])
+        self.assertEqual(tax.tolist(), [1, 2])
+        _, _, _, tax = price_arrays([1, 1], [10, 30], [5, 5], taxed=False)
+        self.assertEqual(tax.tolist(), [0, 0])
+
+
+class PriceBillsTest(unittest.TestCase):
+    def test_matches_decimal_reference(self):
+        rng = random.Random(1)
+        bills = [[("b", "n", rng.randrange(1, 9), round(rng.uniform(0.01, 999), 3), rng.choice(GST_SLABS))
+                  for _ in range(rng.randrange(1, 8))] for _ in range(2_000)]
+        flags = [rng.random() < 0.5 for _ in bills]
+        discounts = [rng.choice([0, 2.5, 10, 12.345, 33.33]) for _ in bills]
+        for lines, include_gst, discount, (_, *totals) in zip(bills, flags, discounts,
+                                                               price_bills(bills, flags, discounts)):
+            self.assertEqual(tuple(totals), reference_totals(lines, include_gst, discount))
+
+    def test_line_totals_add_up(self):
+        items, subtotal, gst, grand_total = price_bills([[("1", "a", 3, 0.285, 5), ("2", "b", 1, 99.99, 28)]],
+                                                        True, 12.5)[0]
+        self.assertEqual(round(sum(item[4] for item in items), 2), subtotal)
+        self.assertEqual(round(subtotal + gst, 2), grand_total)
+
+
+class CartTest(unittest.TestCase):
+    def assert_agrees(self, cart):
+        # The cart's running totals and lines against a full reprice of the saved bill
+        items, subtotal, gst, grand_total = price_bills([cart.bill_lines()], cart.include_gst,
+                                                        cart.discount_bp / 100)[0]
+        self.assertEqual(cart.totals(), (subtotal, gst, grand_total))
+        self.assertEqual([cart.line_total(line) for line in cart], [item[4] for item in items])
+
+    def test_running_totals_match_price_bills(self):
+        rng = random.Random(1)
+        for _ in range(300):
+            cart = Cart()
+            prices = {}
+            for _ in range(rng.randrange(1, 40)):
+                code = str(rng.randrange(30))
+                price = prices.setdefault(code, round(rng.uniform(0.01, 999), 3))
+                cart.add(code, "n" + code, rng.randrange(1, 5), price, rng.choice(GST_SLABS))
+                if rng.random() < 0.2:
+                    cart.set_terms(rng.random() < 0.5, round(rng.uniform(0, 100), 2))
+                self.assert_agrees(cart)
+
+    def test_set_terms_reports_changes(self):
+        cart = Cart()
+        cart.add("1", "Tea", 3, 0.285, 5)
+        self.assertFalse(cart.set_terms(False, 0))
+        self.assertTrue(cart.set_terms(True, 12.5))
+        self.assertFalse(cart.set_terms(True, 12.5))
+        self.assert_agrees(cart)
+
+    def test_clear_resets_totals(self):
+        cart = Cart()
+        cart.add("1", "Tea", 2, 10.5, 18)
+        cart_id = cart.id
+        cart.clear()
+        self.assertEqual(cart.totals(), (0, 0, 0))
+        self.assertEqual(len(cart), 0)
+        self.assertNotEqual(cart.id, cart_id)
+
+
+if __name__ == '__main__':
+    unittest.main()